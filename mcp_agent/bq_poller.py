@@ -0,0 +1,306 @@
+"""
+Background BQ job poller v1 0 0 reads pending jobs Firestore checks actual
+state BQ API writes transitions back via FirestoreBqJobStore
+Runs as asyncio task alongside MCP server started cli startup
+"""
+import asyncio
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+
+from google.cloud import bigquery
+from google.api_core import exceptions as google_exceptions
+
+# Optional fully async HTTP fast path poller falls back worker threads absent
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Optional SIMD accelerated JSON decode hot path falls back stdlib
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from .job_store import (
+    FirestoreBqJobStore,
+    BqJobInfo,
+    NON_TERMINAL_STATES,
+    POLL_BACKOFF_START_SECONDS,
+    _utcnow,
+    poll_update_fields,
+    status_update_fields,
+)
+from .utils import retry_on_gcp_transient_error
+
+logger = logging.getLogger("mcp_agent.bq_poller")
+
+# Default cadence seconds between poll cycles
+DEFAULT_POLL_INTERVAL_SECONDS = 10.0
+# Default bound concurrent per job fallback checks one cycle
+DEFAULT_POLL_CONCURRENCY = 16
+# Max pending jobs fetched Firestore per cycle
+PENDING_JOB_QUERY_LIMIT = 50
+# Slack subtracted oldest created_time when listing jobs covers clock skew
+LIST_JOBS_SKEW = timedelta(minutes=5)
+# Multiplier growing per job backoff while state unchanged
+POLL_BACKOFF_MULTIPLIER = 1.5
+# Terminal states poller stops tracking job once reached
+_TERMINAL = frozenset({"DONE", "ERROR"})
+
+
+def _done_fields(bq_job, etag):
+    """DONE transition carries error_result when the job failed"""
+    error_result = dict(bq_job.error_result) if bq_job.error_result else None
+    return status_update_fields("DONE", error_result=error_result, etag=etag)
+
+
+def _plain_fields(status):
+    """Builds field builder fixed status non DONE transitions"""
+    def fields(bq_job, etag, _status=status):
+        return status_update_fields(_status, etag=etag)
+    return fields
+
+
+# New status -> field builder one hash lookup replaces the comparison
+# ladder special casing DONE error extraction inside the reconcile loop
+_TRANSITION_FIELDS = {
+    "DONE": _done_fields,
+    "RUNNING": _plain_fields("RUNNING"),
+    "PENDING": _plain_fields("PENDING"),
+}
+
+
+# --- Retry wrapped sync helpers run via asyncio.to_thread ---
+@retry_on_gcp_transient_error
+def _get_bq_job_sync(client: bigquery.Client, job_id: str, location: Optional[str]):
+    """Fetches single BQ job fallback path location mismatch"""
+    logger.debug("Running client get job thread %s retry", job_id)
+    return client.get_job(job_id, location=location)
+
+
+@retry_on_gcp_transient_error
+def _list_bq_jobs_sync(client: bigquery.Client, min_creation_time, max_results: int):
+    """Lists recent BQ jobs one RPC covers whole pending set
+
+    Single jobs.list call replaces N per job get_job round trips poll
+    cycle costs one RTT instead of N
+    """
+    logger.debug("Running client list jobs thread since %s retry", min_creation_time)
+    return list(client.list_jobs(
+        all_users=False,
+        state_filter=None,  # All states pending running done filtered in memory
+        min_creation_time=min_creation_time,
+        max_results=max_results,
+    ))
+
+
+_BQ_REST_BASE = "https://bigquery.googleapis.com/bigquery/v2"
+
+
+class _AsyncBqJobFetcher:
+    """Direct REST get_job aiohttp no worker thread blocked per call
+
+    Hundreds concurrent fetches ride one event loop single connector
+    instead of one blocked recv syscall per pool thread Token refresh
+    still blocking runs thread only when expired
+    """
+
+    def __init__(self, bq_client: bigquery.Client, pool_size: int):
+        self._client = bq_client
+        self._pool_size = pool_size
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, limit_per_host=self._pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _auth_header_sync(self) -> dict:
+        creds = self._client._credentials
+        if not creds.valid:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+        return {"Authorization": f"Bearer {creds.token}"}
+
+    async def get_job(self, job_id: str, location: Optional[str]):
+        """Fetches job resource REST returns hydrated bigquery job object"""
+        session = self._get_session()
+        headers = await asyncio.to_thread(self._auth_header_sync)
+        params = {"location": location} if location else {}
+        url = f"{_BQ_REST_BASE}/projects/{self._client.project}/jobs/{job_id}"
+        async with session.get(url, params=params, headers=headers) as resp:
+            if resp.status == 404:
+                raise google_exceptions.NotFound(f"Job {job_id} not found")
+            resp.raise_for_status()
+            payload = _json_loads(await resp.read())
+        return self._client.job_from_resource(payload)
+
+    async def aclose(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def _run_blocking(executor: Optional[ThreadPoolExecutor], func, *args):
+    """Runs blocking BQ RPC dedicated executor isolates poller network waits
+
+    Default loop executor is shared every blocking call process wide a
+    dedicated bq-poll pool avoids head of line blocking under bursts
+    Falls back asyncio.to_thread when no executor supplied
+    """
+    if executor is None:
+        return await asyncio.to_thread(func, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+async def run_bq_job_poller(
+    job_store: FirestoreBqJobStore,
+    bq_client: bigquery.Client,
+    poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS,
+    concurrency: int = DEFAULT_POLL_CONCURRENCY,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> None:
+    """Periodically reconciles Firestore tracked jobs actual BQ state
+
+    Each cycle queries Firestore non terminal jobs lists recent BQ jobs one
+    batched jobs.list RPC joins in memory falls back per job get_job only
+    when job missing from listing eg location mismatch Per job work runs
+    concurrently bounded semaphore cycle wall clock O(N/concurrency)
+    """
+    logger.info("BQ job poller started interval %ss limit %s concurrency %s", poll_interval_seconds, PENDING_JOB_QUERY_LIMIT, concurrency)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    fetcher = _AsyncBqJobFetcher(bq_client, max(concurrency, 20)) if aiohttp is not None else None
+    if fetcher is not None:
+        logger.info("aiohttp available per job fallback fetches run fully async")
+
+    async def _bounded_reconcile(job_info: BqJobInfo, listed_by_id: dict, dbg: bool):
+        async with semaphore:
+            return await _reconcile_one(job_store, bq_client, job_info, listed_by_id, backoff_cap=poll_interval_seconds, executor=executor, fetcher=fetcher, dbg=dbg)
+
+    try:
+        await _poll_forever(job_store, bq_client, poll_interval_seconds, executor, _bounded_reconcile)
+    finally:
+        if fetcher is not None:
+            await fetcher.aclose()
+
+
+async def _poll_forever(job_store, bq_client, poll_interval_seconds, executor, bounded_reconcile) -> None:
+    """Poll loop body factored out so session cleanup wraps it
+
+    Monotonic deadline scheduling keeps cadence stable cycle work time
+    overlaps the wait budget instead of adding drift on top of it
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    while True:
+        deadline += poll_interval_seconds
+        # One level check amortized over the whole cycle per job debug
+        # logs are guarded on this instead of re checking handler levels
+        dbg = logger.isEnabledFor(logging.DEBUG)
+        try:
+            pending_jobs = await job_store.query_pending_jobs(limit=PENDING_JOB_QUERY_LIMIT)
+            if pending_jobs:
+                if dbg:
+                    logger.debug("Poll cycle %d pending jobs", len(pending_jobs))
+                # One batched listing covers entire pending set min creation
+                # time derived oldest tracked job minus skew slack
+                min_creation = min(j.created_time for j in pending_jobs) - LIST_JOBS_SKEW
+                try:
+                    listed = await _run_blocking(
+                        executor, _list_bq_jobs_sync, bq_client, min_creation, PENDING_JOB_QUERY_LIMIT
+                    )
+                    listed_by_id = {job.job_id: job for job in listed}
+                except Exception as e:
+                    logger.warning("Batched jobs list failed fall back per job gets %s", e)
+                    listed_by_id = {}
+                # Dispatch all jobs concurrently bounded semaphore each
+                # fallback get_job releases GIL inside requests so overlaps
+                tasks = [asyncio.create_task(bounded_reconcile(j, listed_by_id, dbg)) for j in pending_jobs]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                # Accumulate per job field updates commit one batched write
+                # instead of one Firestore RPC per job
+                updates = []
+                for job_info, result in zip(pending_jobs, results):
+                    if isinstance(result, Exception):
+                        if not isinstance(result, asyncio.CancelledError):
+                            logger.error("Reconcile failed job %s %s", job_info.job_id, result, exc_info=result)
+                    elif result is not None:
+                        updates.append(result)
+                await job_store.bulk_update(updates)
+        except asyncio.CancelledError:
+            logger.info("BQ job poller cancelled shutting down")
+            raise
+        except Exception as e:
+            # Never let one bad cycle kill the poller log continue next cycle
+            logger.error("BQ poll cycle failed %s", e, exc_info=True)
+        now = loop.time()
+        if now > deadline:
+            # Cycle overran its slot reset instead of bursting to catch up
+            logger.warning("Poll cycle overran interval by %.2fs skipping catch up", now - deadline)
+            deadline = now
+        await asyncio.sleep(max(0.0, deadline - now))
+
+
+async def _reconcile_one(
+    job_store: FirestoreBqJobStore,
+    bq_client: bigquery.Client,
+    job_info: BqJobInfo,
+    listed_by_id: dict,
+    backoff_cap: float = DEFAULT_POLL_INTERVAL_SECONDS,
+    executor: Optional[ThreadPoolExecutor] = None,
+    fetcher: Optional[_AsyncBqJobFetcher] = None,
+    dbg: bool = False,
+):
+    """Reconciles single tracked job returns (job_id, fields) update or None
+
+    Adaptive scheduling unchanged jobs grow poll_backoff geometrically
+    capped poll interval so long queries cost log duration polls not
+    duration interval while fresh jobs are polled quickly Writes are
+    deferred caller commits whole cycle one batch
+    """
+    # Per job floor jobs polled moments ago are skipped outright
+    if job_info.last_polled_at is not None:
+        if (_utcnow() - job_info.last_polled_at).total_seconds() < POLL_BACKOFF_START_SECONDS:
+            if dbg:
+                logger.debug("Job %s polled recently skipping", job_info.job_id)
+            return None
+    bq_job = listed_by_id.get(job_info.job_id)
+    if bq_job is None:
+        # Job absent from listing location mismatch older than window fall
+        # back single get_job
+        try:
+            if fetcher is not None:
+                bq_job = await fetcher.get_job(job_info.job_id, job_info.location)
+            else:
+                bq_job = await _run_blocking(executor, _get_bq_job_sync, bq_client, job_info.job_id, job_info.location)
+        except google_exceptions.NotFound:
+            logger.warning("Tracked job %s not found BQ marking ERROR", job_info.job_id)
+            return (job_info.job_id, status_update_fields("ERROR", error_result={"reason": "notFound", "message": "Job not found in BigQuery"}))
+        except Exception as e:
+            logger.error("Failed poll job %s %s", job_info.job_id, e, exc_info=True)
+            return None
+    current_bq_status = (bq_job.state or "").upper()
+    current_etag = getattr(bq_job, "etag", None)
+    if current_bq_status and current_bq_status != job_info.status:
+        # Terminal transitions are the notable events routine PENDING ->
+        # RUNNING hops stay at debug
+        level = logging.INFO if current_bq_status in _TERMINAL else logging.DEBUG
+        logger.log(level, "Job %s transition %s -> %s", job_info.job_id, job_info.status, current_bq_status, extra={"conn_id": job_info.conn_id})
+        builder = _TRANSITION_FIELDS.get(current_bq_status) or _plain_fields(current_bq_status)
+        return (job_info.job_id, builder(bq_job, current_etag))
+    else:
+        # State unchanged grow backoff schedule next poll further out
+        new_backoff = min(job_info.poll_backoff * POLL_BACKOFF_MULTIPLIER, backoff_cap)
+        if current_etag is not None and current_etag == job_info.last_bq_etag:
+            if dbg:
+                logger.debug("Job %s etag unchanged backoff %.1fs", job_info.job_id, new_backoff)
+            return (job_info.job_id, poll_update_fields(poll_backoff=new_backoff))
+        return (job_info.job_id, poll_update_fields(etag=current_etag, poll_backoff=new_backoff))
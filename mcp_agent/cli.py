@@ -2,28 +2,60 @@ import argparse
 import asyncio
 import logging
 import sys
-from typing import Set
+from typing import FrozenSet
+
+# Pre-built results for the common --tools values; the generator + set build
+# is skipped entirely and downstream membership checks hash into a frozenset.
+_COMMON_TOOL_SETS = {
+    "storage": frozenset({"storage"}),
+    "bigquery": frozenset({"bigquery"}),
+    "storage,bigquery": frozenset({"storage", "bigquery"}),
+    "bigquery,storage": frozenset({"storage", "bigquery"}),
+}
+
+def _import_servers():
+    """Imports server entry points lazily so `--help` and argument errors
+    do not pay the GCP SDK import cost pulled in transitively."""
+    # Ensure utils is importable if running cli directly (might need adjustments based on execution context)
+    try:
+        from .server import run_stdio_server, run_sse_server
+    except ImportError:
+         # Handle case where script is run directly, adjust path if necessary
+         # This is a common pattern but might need refinement based on install/run method
+         import os
+         sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+         from mcp_agent.server import run_stdio_server, run_sse_server
+    return run_stdio_server, run_sse_server
+
+
+def _configure_logging():
+    """Installs the JSON formatter on a stderr handler at startup.
+
+    Handler-level wiring, so importing this module never rewires the root
+    logger. FastJsonFormatter carries the structured extras the modules
+    attach (conn_id from the server's filter, the gcp_retry_* fields)
+    that a plain-text format string would silently drop. Logs go to
+    stderr so stdout/stdin stay free for MCP.
+    """
+    from .utils import FastJsonFormatter
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(FastJsonFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
 
-# Ensure utils is importable if running cli directly (might need adjustments based on execution context)
-try:
-    from .server import run_stdio_server, run_sse_server
-except ImportError:
-     # Handle case where script is run directly, adjust path if necessary
-     # This is a common pattern but might need refinement based on install/run method
-     import os
-     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-     from mcp_agent.server import run_stdio_server, run_sse_server
-
-
-# Configure root logger
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stderr, # Log to stderr so stdout/stdin can be used for MCP
-)
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
+# Prefer uvloop when installed: the workload is pure I/O proxying, and the
+# libuv-backed loop handles the SSE socket churn markedly faster. Soft
+# dependency (perf extra); stdlib loop otherwise.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Run the MCP Agent server for GCS/BigQuery.")
     parser.add_argument(
@@ -46,10 +78,21 @@ def parse_args():
     )
     parser.add_argument(
         "--require-api-key",
-        type=str,
-        default=None,
-        metavar="API_KEY",
-        help="[SSE Only] Require clients to send 'Authorization: Bearer <API_KEY>' header.",
+        action="store_true",
+        help="[SSE Only] Require clients to send 'Authorization: Bearer <key>'. "
+             "The key is read from the Secret Manager version named by "
+             "MCP_AGENT_API_KEY_SECRET_NAME, or from MCP_AGENT_API_KEY directly.",
+    )
+    parser.add_argument(
+        "--bq-poll-concurrency",
+        type=int,
+        default=16,
+        help="Maximum concurrent BQ job status checks per background poll cycle (default: 16).",
+    )
+    parser.add_argument(
+        "--bq-poller-process",
+        action="store_true",
+        help="Run the BQ job poller in a separate OS process so poller CPU spikes cannot add latency to the MCP server event loop.",
     )
     parser.add_argument(
          "--debug",
@@ -59,8 +102,191 @@ def parse_args():
 
     return parser.parse_args()
 
+# ADC credentials are fetched and refreshed once, then shared by every GCP
+# client constructor, so startup performs a single token exchange instead of
+# one metadata-server/ADC round trip per client.
+_shared_credentials = None
+_credentials_lock = None
+
+def _get_shared_credentials():
+    """Returns (credentials, project) from ADC, cached process-wide."""
+    global _shared_credentials, _credentials_lock
+    if _credentials_lock is None:
+        import threading
+        _credentials_lock = threading.Lock()
+    with _credentials_lock:
+        if _shared_credentials is None:
+            from google.auth import default as ga_default
+            from google.auth.transport.requests import Request
+            creds, project = ga_default()
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                # Clients can still refresh lazily on first use.
+                logger.warning(f"Eager credential refresh failed: {e}")
+            _shared_credentials = (creds, project)
+        return _shared_credentials
+
+def _resolve_api_key():
+    """Resolves the SSE API key: Secret Manager first, then environment.
+
+    MCP_AGENT_API_KEY_SECRET_NAME names a Secret Manager secret version
+    (fetched with retries via fetch_secret); MCP_AGENT_API_KEY supplies
+    the key directly, keeping it out of argv and process listings.
+    Returns None when neither yields a key.
+    """
+    import os
+    secret_name = os.environ.get("MCP_AGENT_API_KEY_SECRET_NAME")
+    if secret_name:
+        from .utils import fetch_secret
+        key = fetch_secret(secret_name)
+        if key:
+            return key
+        logger.error(f"Could not fetch API key from Secret Manager: {secret_name}")
+        return None
+    return os.environ.get("MCP_AGENT_API_KEY") or None
+
+# One FirestoreBqJobStore per process: pre-flight, poller and tool dispatch
+# all share the same underlying gRPC channel instead of each constructor
+# paying its own channel allocation and auth bootstrap.
+_job_store = None
+
+def _get_job_store():
+    """Returns the process-wide FirestoreBqJobStore, creating it once."""
+    global _job_store
+    if _job_store is None:
+        import atexit
+        from .job_store import FirestoreBqJobStore
+        creds, project = _get_shared_credentials()
+        _job_store = FirestoreBqJobStore(project=project, credentials=creds)
+        atexit.register(_job_store.close)
+    return _job_store
+
+def _mount_bq_http_adapter(bq_client, pool_size):
+    """Re-sizes the BQ client's HTTP pool for poller-level concurrency.
+
+    get_bq_client() already mounts a 16/32 keep-alive adapter for normal
+    tool traffic; the poller remounts with a pool matched to its own
+    concurrency, which can be larger.
+    """
+    from .gcp_tools.bigquery import mount_http_adapter
+    mount_http_adapter(bq_client, pool_connections=pool_size, pool_maxsize=pool_size)
+
+def _poller_entry(bq_poll_concurrency):
+    """Child-process entry point for the BQ poller (spawn-safe).
+
+    Builds its own clients and event loop; job state flows through
+    Firestore, which the server already reads, so no extra IPC channel is
+    needed between the processes.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .bq_poller import run_bq_job_poller
+    from .gcp_tools.bigquery import get_bq_client  # BQ tools module
+    job_store = _get_job_store()
+    bq_client = get_bq_client()
+    pool_size = max(bq_poll_concurrency, 20)
+    _mount_bq_http_adapter(bq_client, pool_size=pool_size)
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="bq-poll")
+    try:
+        asyncio.run(run_bq_job_poller(job_store, bq_client, concurrency=bq_poll_concurrency, executor=executor))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False)
+
+async def _preflight_clients(enabled_tools):
+    """Initializes the enabled GCP clients concurrently before serving.
+
+    The storage, BigQuery and Firestore bootstraps are independent network
+    round-trips; running them with asyncio.gather costs the slowest one
+    instead of the sum. Imports stay inside the helpers so storage-only
+    runs never load the BigQuery/Firestore stack (and vice versa).
+    """
+    def _init_storage():
+        from .gcp_tools.storage import get_storage_client
+        get_storage_client(credentials=_get_shared_credentials()[0])
+
+    def _init_bigquery():
+        from .gcp_tools.bigquery import get_bq_client  # BQ tools module
+        get_bq_client(credentials=_get_shared_credentials()[0])
+
+    def _init_job_store():
+        from .server import set_job_store
+        set_job_store(_get_job_store())  # Poller and dispatch share one store
+        _get_job_store()._get_db()  # Force Firestore init pre-flight
+
+    inits = []
+    if "storage" in enabled_tools:
+        inits.append(_init_storage)
+    if "bigquery" in enabled_tools:
+        inits.append(_init_bigquery)
+        inits.append(_init_job_store)
+    if inits:
+        await asyncio.gather(*(asyncio.to_thread(init) for init in inits))
+
+async def _run_server_with_poller(server_coro, enabled_tools, bq_poll_concurrency, poller_in_process=False):
+    """Runs the MCP server coroutine alongside the background BQ job poller."""
+    try:
+        await _preflight_clients(enabled_tools)
+    except BaseException:
+        server_coro.close()  # Never awaited; suppress the RuntimeWarning
+        raise
+    poller_coro = None
+    poller_proc = None
+    bq_executor = None
+    if "bigquery" in enabled_tools and poller_in_process:
+        import multiprocessing
+        # GIL isolation: the poller gets its own interpreter and event loop.
+        poller_proc = multiprocessing.get_context("spawn").Process(
+            target=_poller_entry, args=(bq_poll_concurrency,), daemon=True
+        )
+        poller_proc.start()
+        logger.info(f"BQ poller running in child process pid={poller_proc.pid}")
+    elif "bigquery" in enabled_tools:
+        from concurrent.futures import ThreadPoolExecutor
+        from .bq_poller import run_bq_job_poller
+        from .gcp_tools.bigquery import get_bq_client  # BQ tools module
+        job_store = _get_job_store()
+        bq_client = get_bq_client(credentials=_get_shared_credentials()[0])
+        pool_size = max(bq_poll_concurrency, 20)
+        _mount_bq_http_adapter(bq_client, pool_size=pool_size)
+        # Dedicated pool for BQ RPCs, sized to match the HTTP pool, so poller
+        # network waits do not contend with the shared default executor.
+        bq_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="bq-poll")
+        poller_coro = run_bq_job_poller(job_store, bq_client, concurrency=bq_poll_concurrency, executor=bq_executor)
+    try:
+        if poller_coro is not None:
+            # Structured concurrency (3.11 TaskGroup): the poller is tied to
+            # the server's lifetime. Server exit cancels the poller, and a
+            # poller crash tears down the server instead of dying silently.
+            async with asyncio.TaskGroup() as tg:
+                server_task = tg.create_task(server_coro)
+                poller_task = tg.create_task(poller_coro)
+                server_task.add_done_callback(lambda _t: poller_task.cancel())
+        else:
+            await server_coro
+    finally:
+        if bq_executor is not None:
+            bq_executor.shutdown(wait=False)
+        if poller_proc is not None:
+            poller_proc.terminate()
+            poller_proc.join(timeout=5)
+        if "bigquery" in enabled_tools:
+            # Release gRPC channels / HTTP pools held by cached BQ clients
+            # (pre-flight may have initialized them even in process mode).
+            from .gcp_tools.bigquery import close_bq_clients
+            close_bq_clients()
+
 def main():
+    # Load .env before anything reads configuration. The env-driven knobs
+    # (GOOGLE_APPLICATION_CREDENTIALS, MCP_WORKERS, MCP_RETRY_*, ...) are
+    # read at import time by modules we only import later, so this must
+    # run first.
+    from dotenv import load_dotenv
+    load_dotenv()
+
     args = parse_args()
+    _configure_logging()
 
     # Set logging level for all loggers if debug is enabled
     if args.debug:
@@ -72,7 +298,9 @@ def main():
         logger.debug("Debug logging enabled for mcp_agent.")
 
 
-    enabled_tools: Set[str] = set(t.strip().lower() for t in args.tools.split(',') if t.strip())
+    enabled_tools: FrozenSet[str] = _COMMON_TOOL_SETS.get(args.tools.strip().lower()) or frozenset(
+        t.strip().lower() for t in args.tools.split(',') if t.strip()
+    )
     valid_tools = {"storage", "bigquery"}
 
     # Validate tools
@@ -87,18 +315,21 @@ def main():
     logger.info(f"Configuring mcp-agent server...")
     logger.info(f"Enabled tools: {enabled_tools}")
 
+    # Prime the tool registry for exactly the enabled groups; the heavy
+    # google-cloud imports for a disabled group are never paid, and the
+    # first tool call doesn't stall on a lazy import.
+    from .gcp_tools import load_tool_groups
+    load_tool_groups(enabled_tools)
+
     if args.port.lower() == "stdio":
         if args.require_api_key:
              logger.warning("--require-api-key is ignored for stdio mode.")
         logger.info("Mode: STDIO")
         try:
-            # Ensure GCP clients can initialize before entering async loop potentially
-            from .gcp_tools.storage import get_storage_client
-            from .gcp_tools.bigquery import get_bq_client
-            if "storage" in enabled_tools: get_storage_client()
-            if "bigquery" in enabled_tools: get_bq_client()
-            # Run the server
-            asyncio.run(run_stdio_server(enabled_tools))
+            run_stdio_server, _ = _import_servers()
+            # Run the server with the background BQ poller alongside; GCP
+            # client pre-flight happens concurrently inside the runner.
+            asyncio.run(_run_server_with_poller(run_stdio_server(enabled_tools), enabled_tools, args.bq_poll_concurrency, poller_in_process=args.bq_poller_process))
         except KeyboardInterrupt:
             logger.info("Stdio server interrupted by user.")
         except Exception as e:
@@ -110,18 +341,20 @@ def main():
             if not (1024 <= port_num <= 65535):
                  raise ValueError("Port number must be between 1024 and 65535.")
             logger.info(f"Mode: SSE on {args.host}:{port_num}")
+            api_key = None
             if args.require_api_key:
+                 api_key = _resolve_api_key()
+                 if not api_key:
+                      logger.error("--require-api-key set but no key available. Set MCP_AGENT_API_KEY_SECRET_NAME or MCP_AGENT_API_KEY.")
+                      sys.exit(1)
                  logger.info("API Key Authentication: Enabled")
             else:
                  logger.info("API Key Authentication: Disabled")
 
-            # Ensure GCP clients can initialize before entering async loop potentially
-            from .gcp_tools.storage import get_storage_client
-            from .gcp_tools.bigquery import get_bq_client
-            if "storage" in enabled_tools: get_storage_client()
-            if "bigquery" in enabled_tools: get_bq_client()
-            # Run the server
-            asyncio.run(run_sse_server(enabled_tools, args.host, port_num, args.require_api_key))
+            _, run_sse_server = _import_servers()
+            # Run the server with the background BQ poller alongside; GCP
+            # client pre-flight happens concurrently inside the runner.
+            asyncio.run(_run_server_with_poller(run_sse_server(enabled_tools, args.host, port_num, api_key), enabled_tools, args.bq_poll_concurrency, poller_in_process=args.bq_poller_process))
 
         except ValueError as e:
             logger.error(f"Invalid port number specified: {e}")
@@ -1,72 +1,147 @@
 import asyncio
 import logging
-from typing import Dict, Optional, Tuple
+import sys
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-class ConnectionContextManager:
-    """Manages context (GCS bucket, BQ dataset) per connection ID."""
+# Bound on tracked connections; the least recently used entry is evicted
+# once exceeded. Generous: 10k slots objects is ~1 MB.
+DEFAULT_MAX_CONNECTIONS = 10_000
+# Entries untouched this long are reclaimed by the janitor.
+DEFAULT_CONTEXT_TTL_SECONDS = 3600.0
+_JANITOR_INTERVAL_SECONDS = 60.0
+
+class ConnContext:
+    """Per-connection context fields as a slots object.
+
+    A slots instance (~56 B) replaces the ~232 B inner dict previously
+    used to hold at most three strings, and attribute access skips the
+    per-key hash/compare of a dict subscript. Matters when scaling to
+    thousands of concurrent connections.
+    """
+    __slots__ = ("gcs_bucket", "bq", "last_used")
 
     def __init__(self):
-        # Structure: { conn_id: {"gcs_bucket": "...", "bq_project": "...", "bq_dataset": "..."} }
-        self._context_store: Dict[str, Dict[str, Optional[str]]] = {}
-        self._lock = asyncio.Lock()
+        self.gcs_bucket: Optional[str] = None
+        # BQ context is one (project_id, dataset_id) tuple: a single store
+        # on set, and get_bq_context returns it without re-packing.
+        self.bq: Optional[Tuple[str, str]] = None
+        self.last_used: float = monotonic()
+
+    def is_empty(self) -> bool:
+        return self.gcs_bucket is None and self.bq is None
+
+class ConnectionContextManager:
+    """Manages context (GCS bucket, BQ dataset) per connection ID.
+
+    Deliberately lock-free: none of the critical sections here contain an
+    await, so under a single-threaded asyncio loop the dict mutations are
+    already atomic (GIL + cooperative scheduling). An asyncio.Lock would
+    only add a Future allocation and an event-loop yield per call. Should
+    a critical section ever grow real async I/O, prefer a try-acquire
+    fast path (plain boolean flag, falling back to a real lock only when
+    contended) over reinstating an unconditional asyncio.Lock — steady
+    state here is one in-flight command per connection, so the
+    uncontended path is the only one that matters.
+
+    The store is LRU-bounded and TTL-expired so a client that disconnects
+    without a graceful close (crash, dropped transport) cannot grow it
+    unboundedly; clear_connection_context stays the explicit-evict fast
+    path for well-behaved clients.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 ttl_seconds: float = DEFAULT_CONTEXT_TTL_SECONDS):
+        self._context_store: "OrderedDict[str, ConnContext]" = OrderedDict()
+        self._max_connections = max_connections
+        self._ttl_seconds = ttl_seconds
+        # Bound method cached once: hot methods emit via LOAD_ATTR on the
+        # instance instead of LOAD_GLOBAL + LOAD_ATTR per call.
+        self._log_info = logger.info
         logger.info("ConnectionContextManager initialized.")
 
-    async def set_gcs_context(self, conn_id: str, bucket_name: str):
-        async with self._lock:
-            if conn_id not in self._context_store:
-                self._context_store[conn_id] = {}
-            self._context_store[conn_id]["gcs_bucket"] = bucket_name
-            logger.info(f"[Conn: {conn_id}] GCS context set to bucket '{bucket_name}'")
-
-    async def get_gcs_context(self, conn_id: str) -> Optional[str]:
-        async with self._lock:
-            return self._context_store.get(conn_id, {}).get("gcs_bucket")
-
-    async def clear_gcs_context(self, conn_id: str):
-        async with self._lock:
-            if conn_id in self._context_store:
-                if "gcs_bucket" in self._context_store[conn_id]:
-                    del self._context_store[conn_id]["gcs_bucket"]
-                    logger.info(f"[Conn: {conn_id}] GCS context cleared.")
-                if not self._context_store[conn_id]: # Remove conn_id if empty
-                    del self._context_store[conn_id]
-
-    async def set_bq_context(self, conn_id: str, project_id: str, dataset_id: str):
-         async with self._lock:
-            if conn_id not in self._context_store:
-                self._context_store[conn_id] = {}
-            self._context_store[conn_id]["bq_project"] = project_id
-            self._context_store[conn_id]["bq_dataset"] = dataset_id
-            logger.info(f"[Conn: {conn_id}] BQ context set to '{project_id}:{dataset_id}'")
-
-    async def get_bq_context(self, conn_id: str) -> Optional[Tuple[str, str]]:
-         async with self._lock:
-            conn_data = self._context_store.get(conn_id, {})
-            project = conn_data.get("bq_project")
-            dataset = conn_data.get("bq_dataset")
-            if project and dataset:
-                return project, dataset
+    def _ctx_for(self, conn_id: str) -> ConnContext:
+        # Single .get() then insert-on-miss: the setters hash conn_id once
+        # here instead of a containment check plus subscript each.
+        ctx = self._context_store.get(conn_id)
+        if ctx is None:
+            if len(self._context_store) >= self._max_connections:
+                evicted_id, _ = self._context_store.popitem(last=False)
+                logger.warning("[Conn: %s] Context evicted (LRU cap %d reached).", evicted_id, self._max_connections)
+            ctx = self._context_store[conn_id] = ConnContext()
+        else:
+            self._touch(conn_id, ctx)
+        return ctx
+
+    def _touch(self, conn_id: str, ctx: ConnContext):
+        ctx.last_used = monotonic()
+        self._context_store.move_to_end(conn_id)
+
+    def expire_stale(self):
+        """Evicts entries idle longer than the TTL (oldest-first scan)."""
+        cutoff = monotonic() - self._ttl_seconds
+        store = self._context_store
+        while store:
+            conn_id, ctx = next(iter(store.items()))
+            if ctx.last_used >= cutoff:
+                break  # Recency order: everything further on is fresher.
+            del store[conn_id]
+            self._log_info("[Conn: %s] Context expired after %.0fs idle.", conn_id, self._ttl_seconds)
+
+    async def run_janitor(self, interval_seconds: float = _JANITOR_INTERVAL_SECONDS):
+        """Periodic TTL sweep; run as a background task alongside the server."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.expire_stale()
+
+    def set_gcs_context(self, conn_id: str, bucket_name: str):
+        # Interned key: later lookups against the stored key hit the
+        # pointer-identity fast path instead of a full string compare.
+        conn_id = sys.intern(conn_id)
+        self._ctx_for(conn_id).gcs_bucket = bucket_name
+        self._log_info("[Conn: %s] GCS context set to bucket '%s'", conn_id, bucket_name)
+
+    def get_gcs_context(self, conn_id: str) -> Optional[str]:
+        ctx = self._context_store.get(conn_id)
+        if ctx is None:
             return None
+        self._touch(conn_id, ctx)
+        return ctx.gcs_bucket
+
+    def clear_gcs_context(self, conn_id: str):
+        ctx = self._context_store.get(conn_id)
+        if ctx is not None and ctx.gcs_bucket is not None:
+            ctx.gcs_bucket = None
+            self._log_info("[Conn: %s] GCS context cleared.", conn_id)
+            if ctx.is_empty(): # Remove conn_id if empty
+                self._context_store.pop(conn_id, None)
+
+    def set_bq_context(self, conn_id: str, project_id: str, dataset_id: str):
+        conn_id = sys.intern(conn_id)
+        self._ctx_for(conn_id).bq = (project_id, dataset_id)
+        self._log_info("[Conn: %s] BQ context set to '%s:%s'", conn_id, project_id, dataset_id)
+
+    def get_bq_context(self, conn_id: str) -> Optional[Tuple[str, str]]:
+        ctx = self._context_store.get(conn_id)
+        if ctx is None:
+            return None
+        self._touch(conn_id, ctx)
+        # The stored tuple is handed out as-is: immutable, so callers can
+        # keep it, and stable-context connections never see a fresh
+        # allocation per call.
+        return ctx.bq
+
+    def clear_bq_context(self, conn_id: str):
+        ctx = self._context_store.get(conn_id)
+        if ctx is not None and ctx.bq is not None:
+            ctx.bq = None
+            self._log_info("[Conn: %s] BQ context cleared.", conn_id)
+            if ctx.is_empty(): # Remove conn_id if empty
+                self._context_store.pop(conn_id, None)
 
-    async def clear_bq_context(self, conn_id: str):
-        async with self._lock:
-            if conn_id in self._context_store:
-                cleared = False
-                if "bq_project" in self._context_store[conn_id]:
-                    del self._context_store[conn_id]["bq_project"]
-                    cleared = True
-                if "bq_dataset" in self._context_store[conn_id]:
-                    del self._context_store[conn_id]["bq_dataset"]
-                    cleared = True
-                if cleared:
-                     logger.info(f"[Conn: {conn_id}] BQ context cleared.")
-                if not self._context_store[conn_id]: # Remove conn_id if empty
-                    del self._context_store[conn_id]
-
-    async def clear_connection_context(self, conn_id: str):
-        async with self._lock:
-            if conn_id in self._context_store:
-                del self._context_store[conn_id]
-                logger.info(f"[Conn: {conn_id}] All context cleared upon disconnect.")
+    def clear_connection_context(self, conn_id: str):
+        if self._context_store.pop(conn_id, None) is not None:
+            self._log_info("[Conn: %s] All context cleared upon disconnect.", conn_id)
@@ -1,140 +1,288 @@
-# mcp_agent/gcp_tools/__init__.py
-# Make tools easily importable
-from .storage import (
-    gcs_list_buckets,
-    gcs_set_context_bucket,
-    gcs_clear_context_bucket,
-    gcs_list_objects,
-    gcs_read_object,
-    gcs_write_object,
+"""
+Defines MCP tool schemas maps tool names implementation functions
+for GCS BQ version 1 0 0 Stateless Context single canonical registry
+"""
+import json
+import logging
+import types
+from typing import Dict, Callable, Awaitable, Any, Iterable, List, Optional, Set, Tuple
+
+from mcp import types as mcp_types
+
+# Optional fast JSON serializer schema blobs falls back stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from ..utils import McpToolReturnType
+
+logger = logging.getLogger("mcp_agent.gcp_tools")
+
+GcpToolFunction = Callable[[Dict[str, Any], str, Any], Awaitable[McpToolReturnType]] # Type alias
+
+_BQ_TOOL_NAMES = (
+    "bq_list_datasets",
+    "bq_list_tables",
+    "bq_get_table_schema",
+    "bq_get_dataset_schemas",
+    "bq_submit_query",
+    "bq_get_job_status",
+    "bq_get_jobs_status_batch",
+    "bq_get_query_results",
 )
-from .bigquery import (
-    bq_set_context_dataset,
-    bq_clear_context_dataset,
-    bq_list_datasets,
-    bq_list_tables,
-    bq_get_table_schema,
-    bq_query,
+_GCS_TOOL_NAMES = (
+    "gcs_list_buckets",
+    "gcs_list_objects",
+    "gcs_get_read_signed_url",
+    "gcs_get_write_signed_url",
+    "gcs_write_string_object",
 )
 
-# Define tool schemas for MCP advertisement
-from mcp import types as mcp_types
 
-# Schemas can be complex, defining them manually here for clarity
-# In a real app, you might generate these from function signatures or dataclasses
-
-GCS_TOOLS_SCHEMAS = [
-    mcp_types.Tool(
-        name="gcs_list_buckets",
-        description="Lists accessible Google Cloud Storage buckets.",
-        arguments={},
-    ),
-    mcp_types.Tool(
-        name="gcs_set_context_bucket",
-        description="Sets the default GCS bucket for subsequent commands in this session.",
-        arguments={
-            "bucket_name": mcp_types.ToolArgument(
-                type="string", description="The name of the GCS bucket.", is_required=True
-            )
-        },
-    ),
-     mcp_types.Tool(
-        name="gcs_clear_context_bucket",
-        description="Clears the default GCS bucket context for this session.",
-        arguments={},
-    ),
-    mcp_types.Tool(
-        name="gcs_list_objects",
-        description="Lists objects and common prefixes (directories) in a GCS bucket. Uses context bucket if 'bucket_name' is omitted. Supports pagination.",
-        arguments={
-            "bucket_name": mcp_types.ToolArgument(type="string", description="Specific bucket name (overrides context).", is_required=False),
-            "prefix": mcp_types.ToolArgument(type="string", description="Filter results by this prefix (e.g., 'images/').", is_required=False),
-            "page_token": mcp_types.ToolArgument(type="string", description="Token from a previous response to get the next page.", is_required=False),
-            "max_results": mcp_types.ToolArgument(type="integer", description="Maximum items per page.", is_required=False, default_value=100),
-        },
-    ),
-    mcp_types.Tool(
-        name="gcs_read_object",
-        description="Reads the content of an object in a GCS bucket. Uses context bucket if 'bucket_name' is omitted.",
-        arguments={
-            "object_path": mcp_types.ToolArgument(type="string", description="The full path to the object within the bucket.", is_required=True),
-            "bucket_name": mcp_types.ToolArgument(type="string", description="Specific bucket name (overrides context).", is_required=False),
-        },
-    ),
-     mcp_types.Tool(
-        name="gcs_write_object",
-        description="Writes string content to an object in a GCS bucket. Uses context bucket if 'bucket_name' is omitted. Overwrites if exists.",
-        arguments={
-            "object_path": mcp_types.ToolArgument(type="string", description="The full path for the object within the bucket.", is_required=True),
-            "content": mcp_types.ToolArgument(type="string", description="The string content to write.", is_required=True),
-            "bucket_name": mcp_types.ToolArgument(type="string", description="Specific bucket name (overrides context).", is_required=False),
-        },
-    ),
-]
-
-BQ_TOOLS_SCHEMAS = [
-    mcp_types.Tool(
-        name="bq_set_context_dataset",
-        description="Sets the default BigQuery project and dataset for subsequent commands.",
-        arguments={
-            "project_id": mcp_types.ToolArgument(type="string", description="The Google Cloud project ID.", is_required=True),
-            "dataset_id": mcp_types.ToolArgument(type="string", description="The BigQuery dataset ID.", is_required=True),
-        },
-    ),
-     mcp_types.Tool(
-        name="bq_clear_context_dataset",
-        description="Clears the default BigQuery project/dataset context.",
-        arguments={},
-    ),
-     mcp_types.Tool(
-        name="bq_list_datasets",
-        description="Lists accessible BigQuery datasets within a project.",
-        arguments={
-            "project_id": mcp_types.ToolArgument(type="string", description="Specific project ID (defaults to server's default project if omitted).", is_required=False),
-        },
-    ),
-     mcp_types.Tool(
-        name="bq_list_tables",
-        description="Lists tables within a BigQuery dataset. Uses context if project/dataset IDs are omitted.",
-        arguments={
-             "project_id": mcp_types.ToolArgument(type="string", description="Specific project ID (overrides context).", is_required=False),
-             "dataset_id": mcp_types.ToolArgument(type="string", description="Specific dataset ID (overrides context).", is_required=False),
-        },
-    ),
-    mcp_types.Tool(
-        name="bq_get_table_schema",
-        description="Gets the schema of a BigQuery table. Uses context project/dataset if IDs are omitted.",
-        arguments={
-            "table_id": mcp_types.ToolArgument(type="string", description="Table ID (e.g., 'my_table' or 'dataset.my_table').", is_required=True),
-            "project_id": mcp_types.ToolArgument(type="string", description="Specific project ID (overrides context).", is_required=False),
-            "dataset_id": mcp_types.ToolArgument(type="string", description="Specific dataset ID (overrides context).", is_required=False),
-        },
-    ),
-    mcp_types.Tool(
-        name="bq_query",
-        description="Executes a SQL query in BigQuery. Uses context project/dataset for unqualified table names.",
-        arguments={
-            "query": mcp_types.ToolArgument(type="string", description="The SQL query string.", is_required=True),
-            "project_id": mcp_types.ToolArgument(type="string", description="Project ID to run the query in (overrides context default project).", is_required=False),
-            "dataset_id": mcp_types.ToolArgument(type="string", description="Default dataset ID for unqualified table names (overrides context default dataset).", is_required=False),
-            "max_results": mcp_types.ToolArgument(type="integer", description="Maximum rows to return in the first page.", is_required=False, default_value=1000),
-            "page_token": mcp_types.ToolArgument(type="string", description="Page token from a previous query result to fetch the next page.", is_required=False),
-        },
-    ),
-]
-
-# Map tool names to functions
-ALL_TOOLS_MAP = {
-    "gcs_list_buckets": gcs_list_buckets,
-    "gcs_set_context_bucket": gcs_set_context_bucket,
-    "gcs_clear_context_bucket": gcs_clear_context_bucket,
-    "gcs_list_objects": gcs_list_objects,
-    "gcs_read_object": gcs_read_object,
-    "gcs_write_object": gcs_write_object,
-    "bq_set_context_dataset": bq_set_context_dataset,
-    "bq_clear_context_dataset": bq_clear_context_dataset,
-    "bq_list_datasets": bq_list_datasets,
-    "bq_list_tables": bq_list_tables,
-    "bq_get_table_schema": bq_get_table_schema,
-    "bq_query": bq_query,
-}
+def _load_bq_tools() -> Dict[str, GcpToolFunction]:
+    """Imports registers BQ tool group heavy SDK import paid here only"""
+    from . import bigquery as _bq_mod
+    return {name: getattr(_bq_mod, name) for name in _BQ_TOOL_NAMES}
+
+
+def _load_gcs_tools() -> Dict[str, GcpToolFunction]:
+    """Imports registers GCS tool group resolved one symbol at a time
+
+    A missing function is simply not registered advertised no
+    placeholders one partial implementation does not hide the rest
+    module itself may be absent mid refactor
+    """
+    try:
+        from . import storage as _gcs_mod
+    except ImportError:
+        logger.warning("GCS tools module missing none registered")
+        return {}
+    funcs: Dict[str, GcpToolFunction] = {}
+    for _name in _GCS_TOOL_NAMES:
+        _fn = getattr(_gcs_mod, _name, None)
+        if _fn is not None:
+            funcs[_name] = _fn
+    if len(funcs) < len(_GCS_TOOL_NAMES):
+        logger.warning(
+            "GCS tools missing not registered %s",
+            sorted(set(_GCS_TOOL_NAMES) - set(funcs)),
+        )
+    return funcs
+
+
+_TOOL_GROUP_LOADERS = {"storage": _load_gcs_tools, "bigquery": _load_bq_tools}
+
+# Live registry populated one tool group at a time startup knows --tools
+# so a storage only run never imports the BigQuery stack at all
+_tools_map: Dict[str, GcpToolFunction] = {}
+_loaded_groups: Set[str] = set()
+_names_cache: Optional[frozenset] = None
+
+# Schemas built lazily first list_tools call import pays zero Tool object
+# allocations when no client ever lists tools cached thereafter
+_schema_cache: Optional[Tuple[List[mcp_types.Tool], List[mcp_types.Tool]]] = None
+_schema_json_cache: Optional[bytes] = None
+# Per group pre serialized slices comma joined items no brackets
+# get_tools_blob concatenates them tools list serves a constant
+_group_json_cache: Dict[str, bytes] = {}
+
+
+def load_tool_groups(enabled_tools: Iterable[str] = ("storage", "bigquery")) -> None:
+    """Imports registers requested tool groups idempotent
+
+    CLIs call this with the parsed --tools set deferring each group's
+    google cloud import until the group is actually enabled loaded
+    functions land in module globals too the dispatch jump table
+    references them directly
+    """
+    global _names_cache, _schema_cache, _schema_json_cache
+    changed = False
+    for group in enabled_tools:
+        loader = _TOOL_GROUP_LOADERS.get(group)
+        if loader is None or group in _loaded_groups:
+            continue
+        funcs = loader()
+        _tools_map.update(funcs)
+        globals().update(funcs)
+        _loaded_groups.add(group)
+        changed = True
+    if changed:
+        _names_cache = None
+        _schema_cache = None
+        _schema_json_cache = None
+        _group_json_cache.clear()
+
+
+def _ensure_loaded() -> None:
+    # Registry touched before any load_tool_groups call old eager
+    # importer behavior both groups registered
+    if not _loaded_groups:
+        load_tool_groups()
+
+
+def _build_schemas() -> Tuple[List[mcp_types.Tool], List[mcp_types.Tool]]:
+    """Builds caches (gcs, bq) schema lists constructed once on demand
+
+    Filtered to registered tools never advertise tools the dispatcher
+    cannot actually call
+    """
+    global _schema_cache
+    if _schema_cache is not None:
+        return _schema_cache
+    _ensure_loaded()
+    # --- GCS Schemas Context args MANDATORY where applicable ---
+    gcs_schemas: List[mcp_types.Tool] = [
+        mcp_types.Tool( name="gcs_list_buckets", description="Lists accessible GCS buckets", arguments={}),
+        mcp_types.Tool(
+            name="gcs_list_objects", description="Lists objects directories GCS bucket Supports pagination",
+            arguments={
+                "bucket_name": mcp_types.ToolArgument(type="string", description="Bucket name", is_required=True), # Required
+                "prefix": mcp_types.ToolArgument(type="string", description="Filter by prefix", is_required=False),
+                "page_token": mcp_types.ToolArgument(type="string", description="Token next page", is_required=False),
+                "max_results": mcp_types.ToolArgument(type="integer", description="Max items page", is_required=False, default_value=100),
+                "parallel": mcp_types.ToolArgument(type="boolean", description="Fan listing over key ranges big prefixes no pagination", is_required=False, default_value=False),
+                "columnar": mcp_types.ToolArgument(type="boolean", description="Return columns parallel lists instead of objects row dicts", is_required=False, default_value=False),
+            }
+        ),
+        mcp_types.Tool(
+            name="gcs_get_read_signed_url", description="Generates short lived URL read GCS object via HTTP GET",
+            arguments={
+                "bucket_name": mcp_types.ToolArgument(type="string", description="Bucket name", is_required=True), # Required
+                "object_path": mcp_types.ToolArgument(type="string", description="Full path object", is_required=True),
+                "expires_in_seconds": mcp_types.ToolArgument(type="integer", description="URL validity seconds", is_required=False, default_value=300),
+            }
+        ),
+        mcp_types.Tool(
+            name="gcs_get_write_signed_url", description="Generates short lived URL write GCS object via HTTP PUT",
+            arguments={
+                "bucket_name": mcp_types.ToolArgument(type="string", description="Bucket name", is_required=True), # Required
+                "object_path": mcp_types.ToolArgument(type="string", description="Full path object write", is_required=True),
+                "content_type": mcp_types.ToolArgument(type="string", description="Expected MIME type upload", is_required=False),
+                "expires_in_seconds": mcp_types.ToolArgument(type="integer", description="URL validity seconds", is_required=False, default_value=300),
+            }
+        ),
+        mcp_types.Tool(
+            name="gcs_write_string_object", description="Writes small string content directly GCS Not large files",
+            arguments={
+                "bucket_name": mcp_types.ToolArgument(type="string", description="Bucket name", is_required=True), # Required
+                "object_path": mcp_types.ToolArgument(type="string", description="Full path object", is_required=True),
+                "content": mcp_types.ToolArgument(type="string", description="String content write", is_required=True),
+            }
+        ),
+    ]
+    # --- BQ Schemas Context args MANDATORY where applicable ---
+    bq_schemas: List[mcp_types.Tool] = [
+        mcp_types.Tool( name="bq_list_datasets", description="Lists BQ datasets", arguments={ "project_id": mcp_types.ToolArgument(type="string", description="Project ID uses client default if omitted", is_required=False), "force_refresh": mcp_types.ToolArgument(type="boolean", description="Bypass short metadata cache", is_required=False, default_value=False) } ),
+        mcp_types.Tool( name="bq_list_tables", description="Lists tables BQ dataset", arguments={ "project_id": mcp_types.ToolArgument(type="string", description="Project ID", is_required=True), "dataset_id": mcp_types.ToolArgument(type="string", description="Dataset ID", is_required=True), "force_refresh": mcp_types.ToolArgument(type="boolean", description="Bypass short metadata cache", is_required=False, default_value=False) } ),
+        mcp_types.Tool( name="bq_get_table_schema", description="Gets schema BQ table", arguments={ "project_id": mcp_types.ToolArgument(type="string", description="Project ID", is_required=True), "dataset_id": mcp_types.ToolArgument(type="string", description="Dataset ID", is_required=True), "table_id": mcp_types.ToolArgument(type="string", description="Table ID", is_required=True), "force_refresh": mcp_types.ToolArgument(type="boolean", description="Bypass short metadata cache", is_required=False, default_value=False) } ),
+        mcp_types.Tool( name="bq_get_dataset_schemas", description="Gets schemas all tables BQ dataset one call", arguments={ "project_id": mcp_types.ToolArgument(type="string", description="Project ID", is_required=True), "dataset_id": mcp_types.ToolArgument(type="string", description="Dataset ID", is_required=True), "force_refresh": mcp_types.ToolArgument(type="boolean", description="Bypass short metadata cache", is_required=False, default_value=False) } ),
+        mcp_types.Tool( name="bq_submit_query", description="Submits BQ query asynchronously", arguments={ "query": mcp_types.ToolArgument(type="string", description="SQL query", is_required=True), "project_id": mcp_types.ToolArgument(type="string", description="Project ID run query uses client default omitted", is_required=False), "default_dataset_project_id": mcp_types.ToolArgument(type="string", description="Default Project ID unqualified tables", is_required=False), "default_dataset_id": mcp_types.ToolArgument(type="string", description="Default Dataset ID unqualified tables", is_required=False) } ),
+        mcp_types.Tool( name="bq_get_job_status", description="Checks status BQ job", arguments={ "job_id": mcp_types.ToolArgument(type="string", is_required=True), "location": mcp_types.ToolArgument(type="string", is_required=False), "include_first_page": mcp_types.ToolArgument(type="boolean", description="Fetch first results page when DONE set false status only", is_required=False, default_value=True) } ),
+        mcp_types.Tool( name="bq_get_jobs_status_batch", description="Checks status many BQ jobs one call", arguments={ "job_ids": mcp_types.ToolArgument(type="array", description="Job IDs poll together", is_required=True) } ),
+        mcp_types.Tool( name="bq_get_query_results", description="Fetches results page completed BQ job", arguments={ "job_id": mcp_types.ToolArgument(type="string", is_required=True), "page_token": mcp_types.ToolArgument(type="string", is_required=True), "max_results": mcp_types.ToolArgument(type="integer", default_value=1000, is_required=False), "location": mcp_types.ToolArgument(type="string", is_required=False) } ),
+    ]
+    # Advertise only tools whose implementation actually registered
+    gcs_schemas = [t for t in gcs_schemas if t.name in _tools_map]
+    bq_schemas = [t for t in bq_schemas if t.name in _tools_map]
+    _schema_cache = (gcs_schemas, bq_schemas)
+    return _schema_cache
+
+
+def get_tool_schemas() -> List[mcp_types.Tool]:
+    """Returns advertised Tool objects GCS then BQ lazily built cached"""
+    gcs_schemas, bq_schemas = _build_schemas()
+    return gcs_schemas + bq_schemas
+
+
+def _dumps_bytes(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _group_blob(group: str) -> bytes:
+    """Returns comma joined serialized Tool items one group no brackets"""
+    blob = _group_json_cache.get(group)
+    if blob is None:
+        gcs_schemas, bq_schemas = _build_schemas()
+        schemas = gcs_schemas if group == "storage" else bq_schemas
+        blob = b",".join(_dumps_bytes(t.model_dump()) for t in schemas)
+        _group_json_cache[group] = blob
+    return blob
+
+
+def get_tools_blob(enabled_tools: Iterable[str] = ("storage", "bigquery")) -> bytes:
+    """Returns pre baked JSON array bytes requested groups
+
+    Each group slice is serialized once then every tools list response is
+    a concatenation of constants no per request Pydantic traversal
+    """
+    parts = [_group_blob(g) for g in ("storage", "bigquery") if g in enabled_tools]
+    return b"[" + b",".join(p for p in parts if p) + b"]"
+
+
+def get_tool_schemas_json() -> bytes:
+    """Returns schemas pre serialized JSON bytes wire responses skip per
+    request serialization built once first call"""
+    global _schema_json_cache
+    if _schema_json_cache is None:
+        _schema_json_cache = get_tools_blob()
+    return _schema_json_cache
+
+
+def __getattr__(name: str):
+    # Lazy module attributes existing importers keep working without
+    # paying schema construction or group imports at module import time
+    if name == "GCS_TOOLS_SCHEMAS":
+        return _build_schemas()[0]
+    if name == "BQ_TOOLS_SCHEMAS":
+        return _build_schemas()[1]
+    if name == "ALL_TOOLS_MAP":
+        # Read only view dispatchers index it nothing mutates it
+        _ensure_loaded()
+        return types.MappingProxyType(_tools_map)
+    if name == "ALL_TOOL_NAMES":
+        global _names_cache
+        if _names_cache is None:
+            _ensure_loaded()
+            _names_cache = frozenset(_tools_map)
+        return _names_cache
+    if name in _BQ_TOOL_NAMES or name in _GCS_TOOL_NAMES:
+        # Tool function requested before its group loaded load everything
+        _ensure_loaded()
+        if name in _tools_map:
+            return _tools_map[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def dispatch(tool_name: str, arguments: Dict[str, Any], conn_id: str, **kwargs) -> Awaitable[McpToolReturnType]:
+    """Dispatches tool call direct function reference hot path
+
+    match on string literals compiles to a jump table the common case
+    skips the dict indirection entirely Callers must pre check
+    ALL_TOOL_NAMES unknown or unregistered names raise KeyError via the
+    fallback map lookup load_tool_groups publishes loaded functions into
+    module globals so the direct references resolve
+    """
+    match tool_name:
+        case "bq_list_datasets":
+            return bq_list_datasets(arguments, conn_id, **kwargs)
+        case "bq_list_tables":
+            return bq_list_tables(arguments, conn_id, **kwargs)
+        case "bq_get_table_schema":
+            return bq_get_table_schema(arguments, conn_id, **kwargs)
+        case "bq_get_dataset_schemas":
+            return bq_get_dataset_schemas(arguments, conn_id, **kwargs)
+        case "bq_submit_query":
+            return bq_submit_query(arguments, conn_id, **kwargs)
+        case "bq_get_job_status":
+            return bq_get_job_status(arguments, conn_id, **kwargs)
+        case "bq_get_jobs_status_batch":
+            return bq_get_jobs_status_batch(arguments, conn_id, **kwargs)
+        case "bq_get_query_results":
+            return bq_get_query_results(arguments, conn_id, **kwargs)
+        case _:
+            # GCS tools are optional so their cases cannot be spelled as
+            # direct references the map carries them when present
+            return _tools_map[tool_name](arguments, conn_id, **kwargs)
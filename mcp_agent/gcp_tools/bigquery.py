@@ -0,0 +1,704 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Sequence
+
+from google.cloud import bigquery
+from google.api_core import exceptions as google_exceptions, page_iterator
+from mcp import types as mcp_types
+
+# REMOVED: ConnectionContextManager import
+from ..job_store import FirestoreBqJobStore, BqJobInfo # Import Firestore store
+from ..utils import format_success, format_error, format_info, handle_gcp_error, McpToolReturnType
+# Import retry decorator
+from ..utils import retry_on_gcp_transient_error
+
+logger = logging.getLogger("mcp_agent.gcp_tools.bigquery")
+
+# Bounded pool BQ RPCs asyncio.to_thread rides the default unbounded
+# executor burst traffic spawns threads trips BQ rate limits instead a
+# fixed pool plus semaphore backpressures callers before the queue grows
+_BQ_MAX_CONCURRENT_RPCS = 16
+_BQ_EXECUTOR = ThreadPoolExecutor(max_workers=_BQ_MAX_CONCURRENT_RPCS, thread_name_prefix="bq")
+_BQ_RPC_SEM = asyncio.Semaphore(_BQ_MAX_CONCURRENT_RPCS)
+
+
+async def _run_bq(fn, *args, **kwargs):
+    """Runs blocking BQ helper bounded executor semaphore acquired first
+
+    Acquire before submit callers queue on the semaphore not inside the
+    executor keeps thread count RPC concurrency capped together
+    """
+    async with _BQ_RPC_SEM:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_BQ_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+_bq_client: Optional[bigquery.Client] = None # Keep client cache
+_bqstorage_client: Optional[Any] = None # Optional gRPC read client cache
+# Cold start races helpers run on the thread pool double checked lock
+# single init steady state reads never touch it
+_bq_client_lock = threading.Lock()
+
+# Default urllib3 pool is 10 connections concurrent tool calls overflow
+# it discarding warm connections fresh TCP TLS handshake each sized to
+# the RPC executor with headroom bursts reuse keep alive sockets
+_BQ_HTTP_POOL_CONNECTIONS = 16
+_BQ_HTTP_POOL_MAXSIZE = 32
+
+
+def mount_http_adapter(client, pool_connections: int = _BQ_HTTP_POOL_CONNECTIONS, pool_maxsize: int = _BQ_HTTP_POOL_MAXSIZE) -> None:
+    """Mounts sized keep alive HTTP adapter BQ client transport
+
+    Both the API session and the auth refresh session get the adapter
+    the refresh session otherwise keeps its own tiny default pool
+    """
+    try:
+        import requests.adapters
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        client._http.mount("https://", adapter)
+        auth_request = getattr(client._http, "_auth_request", None)
+        auth_session = getattr(auth_request, "session", None)
+        if auth_session is not None:
+            auth_session.mount("https://", adapter)
+        logger.info("BQ HTTP connection pool sized %d/%d", pool_connections, pool_maxsize)
+    except Exception as e:
+        # Transport internals are private API never fail client init over tuning
+        logger.warning("Could not tune BQ HTTP connection pool %s", e)
+
+
+def get_bq_client(credentials=None) -> bigquery.Client:
+    """Initializes returns cached BQ client uses ADC
+
+    Optional credentials lets startup share one google auth Credentials
+    object across every GCP client one token exchange shared refresh
+    """
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is not None:
+                return _bq_client
+            logger.info("Initializing Google Cloud BigQuery client")
+            try:
+                client = bigquery.Client(credentials=credentials)
+                logger.info("BigQuery client initialized project %s", client.project)
+            except Exception as e:
+                logger.critical("Failed to initialize BigQuery client %s", e, exc_info=True)
+                raise RuntimeError(f"BigQuery client initialization failed {e}") from e
+            mount_http_adapter(client)
+            _bq_client = client
+    return _bq_client
+
+_default_project: Optional[str] = None
+
+def get_default_project() -> str:
+    """Returns default GCP project cached module level
+
+    client.project walks client then credentials attributes hot paths
+    resolve the string once here reset when clients close
+    """
+    global _default_project
+    if _default_project is None:
+        _default_project = get_bq_client().project
+    return _default_project
+
+def get_bqstorage_client():
+    """Initializes returns cached BQ Storage read client gRPC transport
+
+    Jobs API itself is REST only but result reads can ride gRPC HTTP/2
+    multiplexed streams when google-cloud-bigquery-storage installed
+    Returns None when optional dependency absent callers fall back REST
+    """
+    global _bqstorage_client
+    if _bqstorage_client is None:
+        try:
+            from google.cloud import bigquery_storage
+        except ImportError:
+            logger.debug("google-cloud-bigquery-storage not installed result reads stay REST")
+            return None
+        logger.info("Initializing BigQuery Storage read client gRPC")
+        try:
+            # gRPC channel keepalive defaults already ping idle HTTP/2
+            # connections streams multiplex one socket no pool tuning needed
+            _bqstorage_client = bigquery_storage.BigQueryReadClient()
+        except Exception as e:
+            logger.warning("Failed initialize BigQuery Storage client falling back REST %s", e)
+            return None
+    return _bqstorage_client
+
+def close_bq_clients() -> None:
+    """Closes cached BQ clients releases gRPC channels HTTP pools teardown
+
+    gRPC ManagedChannel style transports leak sockets when process exits
+    without explicit close so shutdown paths call this
+    """
+    global _bq_client, _bqstorage_client, _default_project
+    _default_project = None
+    if _bqstorage_client is not None:
+        try:
+            transport = getattr(_bqstorage_client, "_transport", None)
+            if transport is not None:
+                transport.close()
+            logger.info("BigQuery Storage client closed")
+        except Exception as e:
+            logger.warning("Error closing BigQuery Storage client %s", e)
+        _bqstorage_client = None
+    if _bq_client is not None:
+        try:
+            _bq_client.close()
+            logger.info("BigQuery client closed")
+        except Exception as e:
+            logger.warning("Error closing BigQuery client %s", e)
+        _bq_client = None
+
+# --- Metadata TTL cache dataset table listings schemas change rarely ---
+# Short window per entry bounds staleness LRU bound caps memory
+METADATA_CACHE_TTL_SECONDS = 120.0
+METADATA_CACHE_MAX_ENTRIES = 1024
+
+_metadata_cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+# Per key locks single flight concurrent misses one RPC not N
+_metadata_locks: Dict[Tuple, asyncio.Lock] = {}
+
+
+def invalidate_metadata_cache(*key_parts: str) -> None:
+    """Drops cached metadata entries matching key parts call after DDL
+
+    No args clears everything (project,) drops one project
+    (project, dataset) drops one dataset listings schemas
+    """
+    if not key_parts:
+        _metadata_cache.clear()
+        return
+    parts = tuple(key_parts)
+    stale = [k for k in _metadata_cache if k[1:1 + len(parts)] == parts]
+    for key in stale:
+        _metadata_cache.pop(key, None)
+
+
+async def _cached_metadata(key: Tuple, supplier: Callable[[], Awaitable[Any]], force_refresh: bool = False) -> Any:
+    """Returns metadata cached TTL window supplier runs only on miss
+
+    Single flight per key concurrent callers missing together await one
+    lock first through issues the RPC the rest read the fresh entry
+    """
+    if not force_refresh:
+        entry = _metadata_cache.get(key)
+        if entry is not None and entry[0] > monotonic():
+            _metadata_cache.move_to_end(key)
+            return entry[1]
+    lock = _metadata_locks.get(key)
+    if lock is None:
+        lock = _metadata_locks[key] = asyncio.Lock()
+    try:
+        async with lock:
+            entry = _metadata_cache.get(key)
+            if not force_refresh and entry is not None and entry[0] > monotonic():
+                return entry[1]
+            value = await supplier()
+            _metadata_cache[key] = (monotonic() + METADATA_CACHE_TTL_SECONDS, value)
+            _metadata_cache.move_to_end(key)
+            while len(_metadata_cache) > METADATA_CACHE_MAX_ENTRIES:
+                _metadata_cache.popitem(last=False)
+    finally:
+        # Drop the per key lock even when the supplier raises distinct
+        # failing keys NotFound typos otherwise leak locks forever the
+        # cache itself is LRU capped the lock dict was not
+        _metadata_locks.pop(key, None)
+    return value
+
+
+# Reference objects are immutable pure functions of their IDs memoized
+# construction skips the parse validate allocate work on repeat lookups
+@functools.lru_cache(maxsize=4096)
+def _dref(project_id: str, dataset_id: str) -> bigquery.DatasetReference:
+    return bigquery.DatasetReference(project_id, dataset_id)
+
+
+@functools.lru_cache(maxsize=4096)
+def _tref(project_id: str, dataset_id: str, table_id: str) -> bigquery.TableReference:
+    return bigquery.TableReference(_dref(project_id, dataset_id), table_id)
+
+
+# --- Apply Retry Decorator Sync Helpers ---
+@retry_on_gcp_transient_error
+def _list_datasets_sync(client: bigquery.Client, project_id: Optional[str]):
+    logger.debug("Running client list datasets thread project %s retry", project_id or "default")
+    return [ds.dataset_id for ds in client.list_datasets(project=project_id)], (project_id or client.project)
+
+@retry_on_gcp_transient_error
+def _list_tables_sync(client: bigquery.Client, dataset_ref: bigquery.DatasetReference):
+    logger.debug("Running client list tables thread %s retry", dataset_ref)
+    return [table.table_id for table in client.list_tables(dataset_ref)]
+
+@retry_on_gcp_transient_error
+def _get_table_sync(client: bigquery.Client, table_ref: bigquery.TableReference):
+    logger.debug("Running client get table thread %s retry", table_ref)
+    return client.get_table(table_ref)
+
+@retry_on_gcp_transient_error
+def _query_dataset_columns_sync(client: bigquery.Client, project_id: str, dataset_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetches every table schema dataset one INFORMATION_SCHEMA query
+
+    Grouping happens here so the cached value is the final per table dict
+    """
+    logger.debug("Running INFORMATION_SCHEMA columns query thread %s:%s retry", project_id, dataset_id)
+    query = (
+        f"SELECT table_name, column_name, data_type, is_nullable "
+        f"FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS` "
+        f"ORDER BY table_name, ordinal_position"
+    )
+    tables: Dict[str, List[Dict[str, Any]]] = {}
+    for row in client.query(query).result():
+        tables.setdefault(row["table_name"], []).append(
+            {"name": row["column_name"], "type": row["data_type"], "nullable": row["is_nullable"] == "YES"}
+        )
+    return tables
+
+@retry_on_gcp_transient_error
+def _submit_job_sync(client: bigquery.Client, query_str: str, job_config: bigquery.QueryJobConfig, project: str):
+    logger.debug("Running client query thread project %s retry", project)
+    return client.query(query=query_str, job_config=job_config, project=project)
+
+@retry_on_gcp_transient_error
+def _get_job_sync(client: bigquery.Client, job_id: str, location: Optional[str]):
+    logger.debug("Running client get job thread %s retry", job_id)
+    return client.get_job(job_id, location=location)
+
+@retry_on_gcp_transient_error
+def _get_query_results_sync(client: bigquery.Client, job_id: str, location: Optional[str], timeout_ms: int = 5000):
+    # Private client API jobs.getQueryResults is the only surface with a
+    # server side wait the REST call parks up to timeout_ms returns early
+    # the moment the job completes
+    logger.debug("Running getQueryResults probe thread job %s retry", job_id)
+    return client._get_query_results(job_id, None, location=location, timeout_ms=timeout_ms)
+
+@retry_on_gcp_transient_error
+def _list_rows_sync(client: bigquery.Client, job_id: str, location: Optional[str], page_token: Optional[str], max_results: int):
+     logger.debug("Running client list rows thread page job %s retry", job_id)
+     rows_iterator = client.list_rows(job_id, location=location, page_token=page_token, max_results=max_results)
+     # Consume exactly one API page iterating the row iterator itself
+     # walks every page buffering rows twice raw payload plus Row objects
+     page_rows = list(next(iter(rows_iterator.pages), ()))
+     return rows_iterator.schema, page_rows, rows_iterator.next_page_token, rows_iterator.total_rows
+
+@retry_on_gcp_transient_error
+def _list_rows_arrow_sync(client: bigquery.Client, job_id: str, location: Optional[str], max_results: int, bqstorage_client):
+     logger.debug("Running client list rows Arrow thread job %s retry", job_id)
+     # page_size not max_results to_arrow refuses the Storage API when
+     # max_results is set warns and reverts to REST the gRPC read
+     # streams the whole result columnar so this path returns the
+     # complete set in one response no continuation token
+     rows_iterator = client.list_rows(job_id, location=location, page_size=max_results)
+     arrow_table = rows_iterator.to_arrow(bqstorage_client=bqstorage_client)
+     total = rows_iterator.total_rows if rows_iterator.total_rows is not None else arrow_table.num_rows
+     if arrow_table.num_rows > max_results:
+         # Defensive cap the caller pre checked the full result fits the
+         # page a stale count must not turn one page into an unbounded
+         # response
+         logger.warning("Arrow read returned %d rows capping to page size %d job %s", arrow_table.num_rows, max_results, job_id)
+         arrow_table = arrow_table.slice(0, max_results)
+     return rows_iterator.schema, arrow_table.to_pylist(), None, total
+
+# Pages at least this many rows ride the Storage read API when available
+_ARROW_MIN_PAGE_ROWS = 1000
+# Hard cap rows per page a runaway max_results otherwise materializes an
+# arbitrarily large page in memory serializes it into one response
+MAX_RESULTS_PER_PAGE = 10_000
+
+
+async def _fetch_result_page(client: bigquery.Client, job_id: str, location: Optional[str], page_token: Optional[str], max_results: int):
+    """Fetches converts one result page picks Arrow gRPC path when it pays
+
+    First page requests whose complete result fits inside the requested
+    page ride the Storage read API one columnar gRPC read one response
+    no continuation needed everything else small pages continuation
+    requests results larger than the page stays REST the pager keeps its
+    max_results clamp and its tokens a read session cannot resume from a
+    REST page token Returns (schema, dict rows, next token, total rows)
+    """
+    bqstorage_client = (
+        get_bqstorage_client()
+        if page_token is None and max_results >= _ARROW_MIN_PAGE_ROWS
+        else None
+    )
+    if bqstorage_client is not None:
+        # Zero wait getQueryResults probe learns the result size before
+        # committing the gRPC read streams the whole result so it only
+        # serves requests where total fits the page bound by max_results
+        # and therefore by MAX_RESULTS_PER_PAGE
+        try:
+            probe = await _run_bq(_get_query_results_sync, client, job_id, location, 0)
+            total_rows = None if probe.total_rows is None else int(probe.total_rows)
+        except Exception as e:
+            logger.debug("Result size probe failed job %s %s", job_id, e)
+            total_rows = None
+        if total_rows is None or total_rows > max_results:
+            bqstorage_client = None
+    if bqstorage_client is not None:
+        schema, dict_rows, token, total = await _run_bq(
+            _list_rows_arrow_sync, client, job_id, location, max_results, bqstorage_client
+        )
+        _decode_byte_columns(dict_rows, schema)
+        return schema, dict_rows, token, total
+    schema, rows, token, total = await _run_bq(
+        _list_rows_sync, client, job_id, location, page_token, max_results
+    )
+    return schema, _rows_to_dicts(rows, schema), token, total
+
+
+async def _iter_pages(client: bigquery.Client, job_id: str, location: Optional[str], page_token: Optional[str] = None, max_results: int = 1000):
+    """Async generator yields (schema, rows, next_token, total) per page
+
+    Internal consumers stream a whole result set without hand rolling the
+    token loop stops after the page whose next token is None
+    """
+    token = page_token
+    while True:
+        schema, rows, next_token, total = await _fetch_result_page(client, job_id, location, token, max_results)
+        yield schema, rows, next_token, total
+        if not next_token:
+            return
+        token = next_token
+
+
+def _decode_byte_columns(dict_rows: List[Dict[str, Any]], schema: Sequence) -> None:
+    """Decodes BYTES columns in place dict rows skipped when schema has none"""
+    byte_names = [f.name for f in schema if f.field_type == "BYTES"]
+    if not byte_names:
+        return
+    for row in dict_rows:
+        for name in byte_names:
+            value = row.get(name)
+            if isinstance(value, bytes):
+                try: row[name] = value.decode('utf-8')
+                except UnicodeDecodeError: row[name] = f"<bytes:{len(value)}>"
+
+# --- Tool Implementations Require explicit args ---
+
+async def bq_list_datasets( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Lists accessible BQ datasets"""
+    project_id = arguments.get("project_id"); # ... type validation ...
+    if project_id is not None and not isinstance(project_id, str): return format_error("Invalid project id must be string")
+    try:
+        client = get_bq_client()
+        dataset_list, used_project = await _cached_metadata(
+            ("datasets", project_id or get_default_project()),
+            lambda: _run_bq(_list_datasets_sync, client, project_id),
+            force_refresh=bool(arguments.get("force_refresh", False)),
+        )
+        return format_success("Datasets listed", data={"project_id": used_project, "datasets": dataset_list})
+    except Exception as e: return handle_gcp_error(e, f"listing BQ datasets project {project_id or 'default'}")
+
+async def bq_list_tables( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Lists tables within required BQ dataset"""
+    project_id = arguments.get("project_id"); dataset_id = arguments.get("dataset_id")
+    if not project_id or not isinstance(project_id, str): return format_error("Missing invalid project id")
+    if not dataset_id or not isinstance(dataset_id, str): return format_error("Missing invalid dataset id")
+    try:
+        client = get_bq_client(); dataset_ref = _dref(project_id, dataset_id)
+        table_list = await _cached_metadata(
+            ("tables", project_id, dataset_id),
+            lambda: _run_bq(_list_tables_sync, client, dataset_ref),
+            force_refresh=bool(arguments.get("force_refresh", False)),
+        )
+        return format_success("Tables listed", data={"project_id": project_id, "dataset_id": dataset_id, "tables": table_list})
+    except Exception as e: return handle_gcp_error(e, f"listing BQ tables dataset {project_id}:{dataset_id}")
+
+async def bq_get_table_schema( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Gets schema required BQ table"""
+    project_id = arguments.get("project_id"); dataset_id = arguments.get("dataset_id"); table_id = arguments.get("table_id")
+    # Simplified validation assumes IDs are mandatory args now
+    if not project_id or not isinstance(project_id, str): return format_error("Missing invalid project id")
+    if not dataset_id or not isinstance(dataset_id, str): return format_error("Missing invalid dataset id")
+    if not table_id or not isinstance(table_id, str): return format_error("Missing invalid table id")
+    # Table ID parsing logic removed assumes simple table ID with required project/dataset args
+    if '.' in table_id: return format_error("Table id should be simple name project dataset provided separately")
+
+    try:
+        client = get_bq_client(); table_ref_str = f"{project_id}.{dataset_id}.{table_id}"
+        table_ref = _tref(project_id, dataset_id, table_id)
+        table = await _cached_metadata(
+            ("table", project_id, dataset_id, table_id),
+            lambda: _run_bq(_get_table_sync, client, table_ref),
+            force_refresh=bool(arguments.get("force_refresh", False)),
+        )
+        schema_list = [{"name": f.name, "type": f.field_type, "mode": f.mode} for f in table.schema]
+        return format_success("Schema retrieved", data={"project_id": table.project, "dataset_id": table.dataset_id, "table_id": table.table_id, "schema": schema_list})
+    except google_exceptions.NotFound: return format_error(f"Table {table_ref_str} not found")
+    except Exception as e: return handle_gcp_error(e, f"getting schema table {table_ref_str}")
+
+# Identical submissions in flight coalesce onto one job retry storms
+# impatient clients double tapping submit otherwise fan out N jobs
+_SUBMIT_INFLIGHT: Dict[str, "asyncio.Task"] = {}
+_SUBMIT_DEDUP_GRACE_SECONDS = 10.0
+
+# Concurrent submit cap below the RPC executor bound a burst of submits
+# otherwise starves status result reads of executor slots also keeps the
+# agent inside BQ concurrent query quotas env overridable per deployment
+_SUBMIT_MAX_CONCURRENT = int(os.environ.get("MCP_BQ_MAX_CONCURRENT_QUERIES", "8"))
+_SUBMIT_SEM = asyncio.Semaphore(_SUBMIT_MAX_CONCURRENT)
+
+
+async def _submit_query_once(client: bigquery.Client, query_str: str, job_default_dataset_ref, target_project: str, conn_id: str, bq_job_store: FirestoreBqJobStore):
+    """Submits one query job records Firestore returns (job_id, location, state)"""
+    job_config = bigquery.QueryJobConfig(use_legacy_sql=False);
+    if job_default_dataset_ref: job_config.default_dataset = job_default_dataset_ref
+    logger.info("Submitting BQ Job Project %s Query %.50s", target_project, query_str, extra={"conn_id": conn_id})
+    async with _SUBMIT_SEM:
+        query_job = await _run_bq(_submit_job_sync, client, query_str, job_config, target_project)
+    job_id = query_job.job_id; location = query_job.location; initial_state = query_job.state
+    logger.info("BQ Job submitted %s Location %s State %s", job_id, location, initial_state, extra={"conn_id": conn_id})
+    # --- Store Job Info Firestore ---
+    job_info = BqJobInfo(job_id=job_id, location=location, conn_id=conn_id, status=initial_state)
+    await bq_job_store.add_job(job_info) # Uses Firestore store now
+    return job_id, location, initial_state
+
+
+_BQ_IDENTIFIER_OK = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-")
+
+async def bq_get_dataset_schemas( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Gets schemas all tables dataset single INFORMATION_SCHEMA query
+
+    Walking N tables via bq get table schema costs N metadata round trips
+    one COLUMNS query returns everything grouped per table rides the
+    metadata cache same TTL force refresh semantics
+    """
+    project_id = arguments.get("project_id"); dataset_id = arguments.get("dataset_id")
+    if not project_id or not isinstance(project_id, str): return format_error("Missing invalid project id")
+    if not dataset_id or not isinstance(dataset_id, str): return format_error("Missing invalid dataset id")
+    # IDs land inside a backtick quoted table reference keep them plain
+    if not set(project_id) <= _BQ_IDENTIFIER_OK or not set(dataset_id) <= _BQ_IDENTIFIER_OK:
+        return format_error("Invalid characters project id or dataset id")
+    try:
+        client = get_bq_client()
+        tables = await _cached_metadata(
+            ("dataset_schemas", project_id, dataset_id),
+            lambda: _run_bq(_query_dataset_columns_sync, client, project_id, dataset_id),
+            force_refresh=bool(arguments.get("force_refresh", False)),
+        )
+        return format_success("Dataset schemas retrieved", data={"project_id": project_id, "dataset_id": dataset_id, "tables": tables})
+    except google_exceptions.NotFound: return format_error(f"Dataset {project_id}:{dataset_id} not found")
+    except Exception as e: return handle_gcp_error(e, f"getting schemas dataset {project_id}:{dataset_id}")
+
+async def bq_submit_query( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Submits BQ query job asynchronously returns job ID uses Firestore
+
+    Single flight per (query, project, default dataset) concurrent
+    duplicates await the same submit task and receive the same job_id the
+    key lingers a short grace window after completion so a duplicate
+    landing just behind the first response still coalesces
+    """
+    query_str = arguments.get("query"); # ... validation ...
+    if not query_str or not isinstance(query_str, str): return format_error("Missing invalid query string")
+    project_id_arg = arguments.get("project_id"); # ... validation ...
+    default_project_id_arg = arguments.get("default_dataset_project_id"); # ... validation ...
+    default_dataset_id_arg = arguments.get("default_dataset_id"); # ... validation ...
+
+    target_project = project_id_arg # Project run job in
+    job_default_dataset_ref: Optional[bigquery.DatasetReference] = None
+    if default_project_id_arg and default_dataset_id_arg:
+         job_default_dataset_ref = _dref(default_project_id_arg, default_dataset_id_arg)
+
+    try:
+        client = get_bq_client();
+        if not target_project: target_project = get_default_project()
+        dedup_key = hashlib.md5(
+            f"{query_str}\x00{target_project}\x00{job_default_dataset_ref}".encode("utf-8")
+        ).hexdigest()
+        submit_task = _SUBMIT_INFLIGHT.get(dedup_key)
+        if submit_task is None:
+            submit_task = asyncio.ensure_future(
+                _submit_query_once(client, query_str, job_default_dataset_ref, target_project, conn_id, bq_job_store)
+            )
+            _SUBMIT_INFLIGHT[dedup_key] = submit_task
+            submit_task.add_done_callback(
+                lambda _t, key=dedup_key: asyncio.get_running_loop().call_later(
+                    _SUBMIT_DEDUP_GRACE_SECONDS, _SUBMIT_INFLIGHT.pop, key, None
+                )
+            )
+        else:
+            logger.info("Duplicate submit coalesced onto in flight job key %.12s", dedup_key, extra={"conn_id": conn_id})
+        # Shield one impatient caller cancelling must not kill the shared submit
+        job_id, location, initial_state = await asyncio.shield(submit_task)
+        return format_success("Query submitted Use bq get job status poll", data={"job_id": job_id, "location": location, "state": initial_state})
+    except google_exceptions.BadRequest as e: return handle_gcp_error(e, "submitting query BadRequest")
+    except google_exceptions.Forbidden as e: return handle_gcp_error(e, "submitting query Forbidden")
+    except Exception as e: return handle_gcp_error(e, f"submitting BQ query")
+
+async def bq_get_job_status( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Checks job status via Firestore if DONE Success fetches first page results"""
+    job_id = arguments.get("job_id"); # ... validation ...
+    if not job_id or not isinstance(job_id, str): return format_error("Missing invalid job id")
+    # Location arg is mainly for fallback API call if needed now
+    location_arg = arguments.get("location"); # ... validation ...
+    # Status only callers dashboards batch pollers skip the first page
+    # fetch entirely a DONE answer costs one Firestore read no BQ rows
+    include_first_page = bool(arguments.get("include_first_page", True))
+
+    logger.debug("Getting job status from Firestore %s", job_id, extra={"conn_id": conn_id})
+    # Speculative first page fetch location known up front both round
+    # trips overlap instead of Firestore then BQ serially loser cancelled
+    spec_rows_task: Optional[asyncio.Task] = None
+    if location_arg and include_first_page:
+        spec_rows_task = asyncio.ensure_future(
+            _fetch_result_page(get_bq_client(), job_id, location_arg, None, 1000)
+        )
+    job_info = await bq_job_store.get_job(job_id) # Reads from Firestore
+
+    if not job_info:
+        _cancel_quietly(spec_rows_task)
+        # Optional Fallback check BQ API directly if not found in Firestore
+        # logger.warning(f"Job {job_id} not found Firestore trying direct API lookup", extra={"conn_id": conn_id})
+        # try: client=get_bq_client(); job = await asyncio.to_thread(_get_job_sync, client, job_id, location_arg); job_info = BqJobInfo(...) # Reconstruct if needed
+        # except google_exceptions.NotFound: return format_error(...)
+        # except Exception as e: return handle_gcp_error(...)
+        # If still not found after fallback
+        return format_error(f"Job {job_id} not found tracked")
+
+    status_data = {"job_id": job_info.job_id, "location": job_info.location, "state": job_info.status, "error_result": job_info.error_result}
+
+    if job_info.status != 'DONE':
+        # Firestore lags the poller by up to a backoff interval a short
+        # getQueryResults long poll catches jobs finishing right now the
+        # caller gets DONE plus results instead of a stale RUNNING
+        try:
+            probe = await _run_bq(_get_query_results_sync, get_bq_client(), job_id, job_info.location or location_arg)
+        except Exception as e:
+            logger.debug("getQueryResults probe failed job %s %s", job_id, e)
+            probe = None
+        if probe is not None and probe.complete:
+            logger.info("Job %s completed within probe window", job_id, extra={"conn_id": conn_id})
+            job_info.status = 'DONE'
+            status_data["state"] = 'DONE'
+            await bq_job_store.update_job_status(job_id, 'DONE')
+
+    if job_info.status == 'DONE':
+        if job_info.error_result:
+            _cancel_quietly(spec_rows_task)
+            return format_error(f"Job {job_id} finished errors", data=status_data)
+        elif not include_first_page:
+            return format_success(f"Job {job_id} completed", data=status_data)
+        else:
+            # --- Job Done Successfully Fetch FIRST page results ---
+            logger.info("Job %s DONE Fetching first page results", job_id, extra={"conn_id": conn_id})
+            try:
+                client = get_bq_client(); max_results_first_page = 1000
+                if spec_rows_task is not None:
+                    # Speculation paid off page already in flight
+                    schema, rows_list, token, total = await spec_rows_task
+                else:
+                    schema, rows_list, token, total = await _fetch_result_page(
+                        client, job_id, job_info.location, None, max_results_first_page # page token None
+                    )
+                schema_list = [{"name": f.name, "type": f.field_type} for f in schema]
+                status_data["schema"] = schema_list; status_data["rows"] = rows_list; status_data["next_page_token"] = token; status_data["total_rows"] = total
+                return format_success(f"Job {job_id} completed Returning first page results", data=status_data)
+            except Exception as e:
+                logger.error("Error fetching first page results completed job %s %s", job_id, e, exc_info=True, extra={"conn_id": conn_id})
+                # Return DONE status indicate result fetch error
+                return format_error(f"Job {job_id} completed but failed fetch first page results {e}", data = {**status_data, "rows": None, "schema": None, "next_page_token": None}) # type ignore
+    else:
+        # Job PENDING or RUNNING
+        _cancel_quietly(spec_rows_task)
+        logger.info("Job %s still %s", job_id, job_info.status, extra={"conn_id": conn_id})
+        return format_info(f"Job {job_id} currently {job_info.status}", data=status_data)
+
+
+def _cancel_quietly(task: Optional[asyncio.Task]) -> None:
+    """Cancels speculative task swallows result never retrieved warnings"""
+    if task is not None:
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def bq_get_jobs_status_batch( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Checks status many jobs one call Firestore reads issued concurrently
+
+    N serial polls cost N round trips gathered reads cost one wall clock
+    wait Status only callers fetch pages via bq get query results
+    """
+    job_ids = arguments.get("job_ids")
+    if not job_ids or not isinstance(job_ids, list) or not all(isinstance(j, str) and j for j in job_ids):
+        return format_error("Missing invalid job ids must be non empty list strings")
+    try:
+        infos = await asyncio.gather(*(bq_job_store.get_job(j) for j in job_ids))
+    except Exception as e:
+        return handle_gcp_error(e, "batch reading job statuses")
+    jobs = []
+    for job_id, job_info in zip(job_ids, infos):
+        if job_info is None:
+            jobs.append({"job_id": job_id, "state": None, "tracked": False})
+        else:
+            jobs.append({"job_id": job_info.job_id, "location": job_info.location, "state": job_info.status, "error_result": job_info.error_result, "tracked": True})
+    return format_success("Job statuses retrieved", data={"jobs": jobs})
+
+
+async def bq_get_query_results( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
+    """Fetches specific page results completed BQ query job requires page token"""
+    job_id = arguments.get("job_id"); page_token = arguments.get("page_token"); location_arg = arguments.get("location")
+    # Validation
+    if not job_id or not isinstance(job_id, str): return format_error("Missing invalid job id")
+    if not page_token or not isinstance(page_token, str): return format_error("Missing invalid required argument page token fetch subsequent pages")
+    if location_arg is not None and not isinstance(location_arg, str): return format_error("Invalid location")
+    try: max_results = int(arguments.get("max_results", 1000)); # ... range check ...
+    except (ValueError, TypeError): max_results = 1000
+    max_results = max(1, min(max_results, MAX_RESULTS_PER_PAGE)) # Clamp bound page memory
+
+    # Determine location argument > stored job info > error
+    location = location_arg
+    if not location:
+        job_info = await bq_job_store.get_job(job_id) # Read from Firestore
+        if job_info: location = job_info.location
+        else: return format_error(f"Cannot fetch results page Location job {job_id} unknown Please provide location")
+    if not location: return format_error(f"Cannot fetch results page Location job {job_id} could not be determined")
+
+    try:
+        client = get_bq_client()
+        logger.debug("Getting results page BQ job %s Loc %s PageToken %.10s", job_id, location, page_token, extra={"conn_id": conn_id})
+        # Fetch requested page Arrow or REST path picked by size
+        schema, rows_list, token, total = await _fetch_result_page(
+            client, job_id, location, page_token, max_results
+        )
+        schema_list = [{"name": f.name, "type": f.field_type} for f in schema]
+        return format_success("Query results page retrieved", data={"job_id": job_id, "location": location, "schema": schema_list, "rows": rows_list, "next_page_token": token, "total_rows": total})
+    except google_exceptions.NotFound: return format_error(f"Job {job_id} not found or invalid page token")
+    except Exception as e: return handle_gcp_error(e, f"getting results page job {job_id}")
+
+
+# Field types whose cells need more than Row to dict conversion BYTES
+# decode here RECORD STRUCT GEOGRAPHY lean on default=str serialization
+_CUSTOM_CONVERT_TYPES = frozenset({"BYTES", "RECORD", "STRUCT", "GEOGRAPHY"})
+
+
+def _rows_to_dicts(rows: Sequence, schema: Sequence) -> List[Dict[str, Any]]:
+    """Converts result page Rows JSON serializable dicts schema driven
+
+    The converter is specialized once per page from the schema plain
+    scalar pages the common case take a bare dict(Row) comprehension no
+    per cell work at all only pages carrying custom types walk columns
+    """
+    if not any(f.field_type in _CUSTOM_CONVERT_TYPES for f in schema):
+        return [dict(r) for r in rows]
+    names = [f.name for f in schema]
+    byte_cols = [i for i, f in enumerate(schema) if f.field_type == "BYTES"]
+    if not byte_cols:
+        return [dict(zip(names, r.values())) for r in rows]
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        values = list(r.values())
+        for i in byte_cols:
+            value = values[i]
+            if isinstance(value, bytes):
+                try: values[i] = value.decode('utf-8')
+                except UnicodeDecodeError: values[i] = f"<bytes:{len(value)}>"
+        out.append(dict(zip(names, values)))
+    return out
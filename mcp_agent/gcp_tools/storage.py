@@ -1,219 +1,643 @@
+"""
+GCS tool implementations version 1 0 0 Stateless Context explicit
+bucket object arguments every call signed URLs preferred large payloads
+"""
 import asyncio
+import binascii
+import functools
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional, Tuple, Sequence
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
 
-from google.cloud import bigquery
-from google.api_core import exceptions as google_exceptions, page_iterator
-from mcp import types as mcp_types
+from google.cloud import storage
+from google.api_core import exceptions as google_exceptions
 
-# REMOVED: ConnectionContextManager import
-from ..job_store import FirestoreBqJobStore # Import Firestore store
-from ..utils import format_success, format_error, format_info, handle_gcp_error, McpToolReturnType
-# Import retry decorator
+# Optional native async HTTP small uploads skip the thread hop entirely
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Optional C level argument validation one convert replaces the per field
+# isinstance chain ~15 interpreter ops per call error strings name fields
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Optional gRPC SignBlob without a local private key the REST IAM round
+# trip the SDK fallback pays is the slow path under default credentials
+try:
+    from google.cloud.iam_credentials_v1 import IAMCredentialsClient
+except ImportError:
+    IAMCredentialsClient = None
+
+if msgspec is not None:
+    class _ListObjectsArgs(msgspec.Struct):
+        bucket_name: str
+        prefix: Optional[str] = None
+        page_token: Optional[str] = None
+        max_results: int = 100
+        parallel: bool = False
+        columnar: bool = False
+
+    class _SignedUrlArgs(msgspec.Struct):
+        bucket_name: str
+        object_path: str
+        content_type: Optional[str] = None
+        expires_in_seconds: int = 300
+
+    class _WriteStringArgs(msgspec.Struct):
+        bucket_name: str
+        object_path: str
+        content: str
+
+from ..utils import format_success, format_error, handle_gcp_error, McpToolReturnType
 from ..utils import retry_on_gcp_transient_error
 
-logger = logging.getLogger("mcp_agent.gcp_tools.bigquery")
+logger = logging.getLogger("mcp_agent.gcp_tools.storage")
 
-_bq_client: Optional[bigquery.Client] = None # Keep client cache
+# Direct string uploads pass through the server keep them small signed
+# URLs are the path for anything bigger
+MAX_STRING_UPLOAD_BYTES = 5 * 1024 * 1024
 
-def get_bq_client() -> bigquery.Client:
-    """Initializes returns cached BQ client uses ADC"""
-    # ... (implementation unchanged) ...
-    global _bq_client; # ... init logic ...; return _bq_client
+# Bounded pool GCS RPCs mirrors the BQ module asyncio.to_thread rides
+# the unbounded default executor thread thrash past ~10 threads instead
+# a fixed pool plus semaphore backpressures callers size env overridable
+_GCS_MAX_CONCURRENT_RPCS = int(os.environ.get("MCP_GCS_WORKERS", "16"))
+_GCS_POOL = ThreadPoolExecutor(max_workers=_GCS_MAX_CONCURRENT_RPCS, thread_name_prefix="gcs")
+_GCS_RPC_SEM = asyncio.Semaphore(_GCS_MAX_CONCURRENT_RPCS)
+
+
+async def _run_gcs(fn, *args, **kwargs):
+    """Runs blocking GCS helper bounded executor semaphore acquired first
+
+    Acquire before submit callers queue on the semaphore not inside the
+    executor keeps thread count RPC concurrency capped together
+    """
+    async with _GCS_RPC_SEM:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_GCS_POOL, functools.partial(fn, *args, **kwargs))
+
+
+_storage_client: Optional[storage.Client] = None
+# First touch races N concurrent requests during cold start each building
+# a client plus HTTP session double checked lock one init rest reuse
+# steady state reads skip the lock entirely
+_storage_client_lock = threading.Lock()
+
+# Default transport keeps a 10 connection urllib3 pool concurrent
+# listings uploads overflow it discarding warm connections TLS handshake
+# each replacement sized pool plus transport level retry smooths the tail
+_GCS_HTTP_POOL_SIZE = 64
+
+
+def _build_pooled_session(credentials):
+    """Builds AuthorizedSession sized keep alive pool status retries"""
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    import requests.adapters
+    from urllib3.util.retry import Retry
+
+    if credentials is None:
+        credentials, _ = google.auth.default()
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=_GCS_HTTP_POOL_SIZE,
+        pool_maxsize=_GCS_HTTP_POOL_SIZE,
+        max_retries=Retry(total=5, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    session.mount("https://", adapter)
+    return credentials, session
+
+
+def get_storage_client(credentials=None) -> storage.Client:
+    """Initializes returns cached GCS client pooled transport uses ADC
+
+    Optional credentials lets startup share one google auth Credentials
+    object across every GCP client one token exchange shared refresh
+    """
+    global _storage_client
+    if _storage_client is None:
+        with _storage_client_lock:
+            if _storage_client is not None:
+                return _storage_client
+            logger.info("Initializing Google Cloud Storage client")
+            try:
+                try:
+                    credentials, session = _build_pooled_session(credentials)
+                except Exception as e:
+                    # Transport tuning is best effort never block startup on it
+                    logger.warning("Could not build pooled GCS session using default transport %s", e)
+                    session = None
+                _storage_client = storage.Client(credentials=credentials, _http=session)
+                logger.info("Storage client initialized project %s pool %d", _storage_client.project, _GCS_HTTP_POOL_SIZE)
+            except Exception as e:
+                logger.critical("Failed to initialize Storage client %s", e, exc_info=True)
+                raise RuntimeError(f"Storage client initialization failed {e}") from e
+    return _storage_client
+
+
+def close_storage_client() -> None:
+    """Closes cached GCS client releases HTTP pool teardown"""
+    global _storage_client, _iam_client
+    if _storage_client is not None:
+        try:
+            _storage_client.close()
+            logger.info("Storage client closed")
+        except Exception as e:
+            logger.warning("Error closing Storage client %s", e)
+        _storage_client = None
+    if _iam_client is not None:
+        try:
+            _iam_client.transport.close()
+        except Exception as e:
+            logger.warning("Error closing IAM credentials client %s", e)
+        _iam_client = None
+
+
+# --- Signed URL TTL cache ---
+# generate_signed_url pays RSA signing or an IAM SignBlob round trip per
+# call ~40ms hot objects re request the same URL constantly expirations
+# round up to coarse buckets so identical requests collide cache entries
+# serve while their remaining validity still covers what the caller asked
+SIGNED_URL_CACHE_MAX_ENTRIES = 2048
+_SIGNED_URL_EXPIRY_BUCKET_SECONDS = 300
+_SIGNED_URL_SAFETY_MARGIN_SECONDS = 30.0
+
+# Plain dict GIL atomic get set suffices two concurrent misses sign twice
+# harmless last write wins no lock on the hot path
+_signed_url_cache: Dict[Tuple, Tuple[str, float]] = {}
+
+
+def _bucketed_expiry_seconds(expires_in_seconds: int) -> int:
+    """Rounds validity plus safety margin strictly up the next bucket
+
+    Strict round up keeps a fresh entry's lifetime above request plus
+    margin rounding to the same bucket as the request 300 in 300 out
+    left zero headroom every lookup missed and re signed
+    """
+    bucket = _SIGNED_URL_EXPIRY_BUCKET_SECONDS
+    return (int(expires_in_seconds + _SIGNED_URL_SAFETY_MARGIN_SECONDS) // bucket + 1) * bucket
+
+
+def invalidate_signed_url_cache() -> None:
+    """Drops every cached signed URL call after credential rotation"""
+    _signed_url_cache.clear()
+
+
+# Shared gRPC IAM credentials client SignBlob calls multiplex one
+# channel reused across requests instead of a REST exchange per sign
+_iam_client = None
+_iam_client_lock = threading.Lock()
+
+
+def _get_iam_client():
+    """Initializes returns cached IAMCredentialsClient double checked"""
+    global _iam_client
+    if _iam_client is None:
+        with _iam_client_lock:
+            if _iam_client is None:
+                _iam_client = IAMCredentialsClient()
+                logger.info("IAM credentials client initialized SignBlob over gRPC")
+    return _iam_client
+
+
+def _iam_sign_blob(service_account_email: str, payload: bytes) -> bytes:
+    """Signs payload via IAM SignBlob impersonating the given account"""
+    response = _get_iam_client().sign_blob(
+        name=f"projects/-/serviceAccounts/{service_account_email}",
+        payload=payload,
+    )
+    return response.signed_blob
+
+
+@functools.lru_cache(maxsize=4096)
+def _v4_static_parts(bucket_name: str, object_path: str, content_type: Optional[str]) -> Tuple[str, str, str]:
+    """Returns (resource, canonical headers, signed headers) pure strings
+
+    For a fixed (bucket, object, content type) these never change only
+    timestamp expiration vary per URL memoized the hot path skips the
+    quoting joining work
+    """
+    from urllib.parse import quote
+    resource = "/{}/{}".format(bucket_name, quote(object_path, safe="/~"))
+    if content_type:
+        return resource, f"content-type:{content_type}\nhost:storage.googleapis.com\n", "content-type;host"
+    return resource, "host:storage.googleapis.com\n", "host"
+
+
+def _fast_v4_signed_url(creds, bucket_name: str, object_path: str, method: str, expiration_seconds: int, content_type: Optional[str] = None) -> str:
+    """Builds V4 signed URL from the memoized skeleton local key signing
+
+    generate_signed_url re derives host scope credential strings every
+    call here only x goog date expires signature are computed fresh
+    signs locally when credentials carry a key otherwise via the shared
+    gRPC IAM SignBlob client caller falls back SDK when neither works
+    """
+    from urllib.parse import quote
+    signer_email = getattr(creds, "signer_email", None) or getattr(creds, "service_account_email", None)
+    if not signer_email or signer_email == "default":
+        raise ValueError("No signer email on credentials")
+    resource, canonical_headers, signed_headers = _v4_static_parts(bucket_name, object_path, content_type)
+    request_timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    credential_scope = f"{request_timestamp[:8]}/auto/storage/goog4_request"
+    # Keys already in sorted order V4 requires lexicographic query string
+    canonical_query = "&".join((
+        "X-Goog-Algorithm=GOOG4-RSA-SHA256",
+        "X-Goog-Credential=" + quote(f"{signer_email}/{credential_scope}", safe=""),
+        "X-Goog-Date=" + request_timestamp,
+        "X-Goog-Expires=" + str(expiration_seconds),
+        "X-Goog-SignedHeaders=" + quote(signed_headers, safe=""),
+    ))
+    canonical_request = "\n".join((method, resource, canonical_query, canonical_headers, signed_headers, "UNSIGNED-PAYLOAD"))
+    string_to_sign = "\n".join((
+        "GOOG4-RSA-SHA256", request_timestamp, credential_scope,
+        hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+    ))
+    sign_bytes = getattr(creds, "sign_bytes", None)
+    if sign_bytes is not None:
+        raw_signature = sign_bytes(string_to_sign.encode("utf-8"))
+    elif IAMCredentialsClient is not None:
+        raw_signature = _iam_sign_blob(signer_email, string_to_sign.encode("utf-8"))
+    else:
+        raise ValueError("Credentials cannot sign locally IAM client unavailable")
+    signature = binascii.hexlify(raw_signature).decode()
+    return f"https://storage.googleapis.com{resource}?{canonical_query}&X-Goog-Signature={signature}"
 
-# --- Apply Retry Decorator Sync Helpers ---
-@retry_on_gcp_transient_error
-def _get_dataset_sync(client: bigquery.Client, dataset_ref: bigquery.DatasetReference):
-    logger.debug(f"Running client get dataset thread {dataset_ref} retry")
-    client.get_dataset(dataset_ref)
 
 @retry_on_gcp_transient_error
-def _list_datasets_sync(client: bigquery.Client, project_id: Optional[str]):
-    logger.debug(f"Running client list datasets thread project {project_id or 'default'} retry")
-    return [ds.dataset_id for ds in client.list_datasets(project=project_id)], (project_id or client.project)
+def _generate_signed_url_sync(client: storage.Client, bucket_name: str, object_path: str, method: str, expires_in_seconds: int, content_type: Optional[str] = None) -> Tuple[str, int]:
+    """Returns (signed URL, validity seconds) cache first sign on miss"""
+    bucketed = _bucketed_expiry_seconds(expires_in_seconds)
+    key = (bucket_name, object_path, method, content_type, bucketed)
+    now = monotonic()
+    entry = _signed_url_cache.get(key)
+    if entry is not None and entry[1] - now >= expires_in_seconds + _SIGNED_URL_SAFETY_MARGIN_SECONDS:
+        logger.debug("Signed URL cache hit %s %s %s", method, bucket_name, object_path)
+        return entry[0], int(entry[1] - now)
+    logger.debug("Running generate signed url thread %s %s %s retry", method, bucket_name, object_path)
+    url = None
+    creds = client._credentials
+    if getattr(creds, "sign_bytes", None) is not None or IAMCredentialsClient is not None:
+        try:
+            url = _fast_v4_signed_url(creds, bucket_name, object_path, method, bucketed, content_type)
+        except Exception as e:
+            # No signer email IAM permission etc SDK path handles SignBlob
+            logger.debug("Fast V4 signer unavailable falling back SDK %s", e)
+    if url is None:
+        blob = client.bucket(bucket_name).blob(object_path)
+        url = blob.generate_signed_url(
+            version="v4", expiration=timedelta(seconds=bucketed), method=method, content_type=content_type,
+        )
+    if len(_signed_url_cache) >= SIGNED_URL_CACHE_MAX_ENTRIES:
+        # Lazy eviction drop expired entries wholesale clear if all fresh
+        stale = [k for k, v in _signed_url_cache.items() if v[1] <= now]
+        for k in stale:
+            _signed_url_cache.pop(k, None)
+        if len(_signed_url_cache) >= SIGNED_URL_CACHE_MAX_ENTRIES:
+            _signed_url_cache.clear()
+    _signed_url_cache[key] = (url, now + bucketed)
+    return url, bucketed
 
+
+# --- Retry wrapped sync helpers run via threads ---
 @retry_on_gcp_transient_error
-def _list_tables_sync(client: bigquery.Client, dataset_ref: bigquery.DatasetReference):
-    logger.debug(f"Running client list tables thread {dataset_ref} retry")
-    return [table.table_id for table in client.list_tables(dataset_ref)]
+def _list_buckets_sync(client: storage.Client) -> List[str]:
+    logger.debug("Running client list buckets thread retry")
+    return [b.name for b in client.list_buckets()]
+
+
+# Projection only the fields the response carries large listings are
+# dominated by bytes over wire default projection hauls ACLs checksums
+# generation metadata nobody reads
+_LIST_BLOBS_FIELDS = "items(name,size,updated,contentType),prefixes,nextPageToken"
+
+
+def _page_to_dicts(page) -> List[Dict[str, Any]]:
+    """Converts one listing page result dicts presized fill by index
+
+    Page length is known up front a presized list skips the growth
+    reallocation copies append pays on thousand entry pages
+    """
+    if page is None:
+        return []
+    results: List[Dict[str, Any]] = [None] * page.num_items
+    i = 0
+    for blob_item in page:
+        results[i] = {
+            "name": blob_item.name,
+            "size": blob_item.size,
+            # REST already returns RFC3339 strings reuse them isoformat
+            # parses re formats allocates a datetime per blob for nothing
+            "updated": blob_item._properties.get("updated"),
+            "content_type": blob_item.content_type,
+        }
+        i += 1
+    # Trim partial pages num_items can over count when iteration stops short
+    del results[i:]
+    return results
+
 
 @retry_on_gcp_transient_error
-def _get_table_sync(client: bigquery.Client, table_ref: bigquery.TableReference):
-    logger.debug(f"Running client get table thread {table_ref} retry")
-    return client.get_table(table_ref)
+def _list_blobs_sync(client: storage.Client, bucket_name: str, prefix: Optional[str], delimiter: Optional[str], page_token: Optional[str], max_results: int):
+    logger.debug("Running client list blobs thread %s prefix %s retry", bucket_name, prefix)
+    blobs_iterator = client.list_blobs(
+        bucket_name, prefix=prefix, delimiter=delimiter, page_token=page_token,
+        max_results=max_results, page_size=min(max_results, 1000), fields=_LIST_BLOBS_FIELDS,
+    )
+    # Consume exactly one API page iterating the iterator itself walks
+    # every page up to max_results
+    results = _page_to_dicts(next(iter(blobs_iterator.pages), None))
+    return results, sorted(blobs_iterator.prefixes), blobs_iterator.next_page_token
+
 
 @retry_on_gcp_transient_error
-def _submit_job_sync(client: bigquery.Client, query_str: str, job_config: bigquery.QueryJobConfig, project: str):
-    logger.debug(f"Running client query thread project {project} retry")
-    return client.query(query=query_str, job_config=job_config, project=project)
+def _list_blobs_range_sync(client: storage.Client, bucket_name: str, prefix: Optional[str], delimiter: Optional[str], start_offset: Optional[str], end_offset: Optional[str], max_results: int):
+    logger.debug("Running client list blobs range thread %s [%s, %s) retry", bucket_name, start_offset, end_offset)
+    blobs_iterator = client.list_blobs(
+        bucket_name, prefix=prefix, delimiter=delimiter,
+        start_offset=start_offset, end_offset=end_offset,
+        max_results=max_results, page_size=min(max_results, 1000), fields=_LIST_BLOBS_FIELDS,
+    )
+    results = _page_to_dicts(next(iter(blobs_iterator.pages), None))
+    return results, blobs_iterator.prefixes
+
+
+# Characters splitting the keyspace into listing ranges offsets make the
+# split exact the head range before the first bound and tail range after
+# the last bound cover names starting outside the charset
+_PARALLEL_LIST_CHARSET = sorted("0123456789abcdefghijklmnopqrstuvwxyz")
+_PARALLEL_LIST_WORKERS = 8
+
+
+async def _list_blobs_parallel(client: storage.Client, bucket_name: str, prefix: Optional[str], delimiter: Optional[str], max_results: int):
+    """Fans listing out over lexicographic ranges work stealing workers
+
+    Single iterator listings are RTT bound one page round trip at a time
+    here start end offset ranges under the prefix list concurrently each
+    worker steals the next pending range when its own drains ranges
+    partition the keyspace exactly so the merge preserves semantics
+    """
+    base = prefix or ""
+    bounds = [base + c for c in _PARALLEL_LIST_CHARSET]
+    pending = deque()
+    pending.append((None, bounds[0]))
+    for i in range(len(bounds) - 1):
+        pending.append((bounds[i], bounds[i + 1]))
+    pending.append((bounds[-1], None))
+
+    results: List[Dict[str, Any]] = []
+    prefixes: set = set()
+
+    async def _worker():
+        while pending and len(results) < max_results:
+            try:
+                start, end = pending.popleft()
+            except IndexError:
+                return
+            objects, range_prefixes = await _run_gcs(
+                _list_blobs_range_sync, client, bucket_name, prefix, delimiter, start, end, max_results
+            )
+            results.extend(objects)
+            prefixes.update(range_prefixes)
+
+    await asyncio.gather(*(_worker() for _ in range(_PARALLEL_LIST_WORKERS)))
+    results.sort(key=lambda o: o["name"])
+    return results[:max_results], sorted(prefixes)
+
+
+def _objects_to_columns(objects: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Transposes result dicts four parallel lists SoA layout
+
+    The JSON encoder then walks flat homogeneous lists instead of paying
+    dict key hashing per entry roughly halves encode work plus the per
+    entry small dict allocations on thousand blob pages
+    """
+    return {
+        "names": [o["name"] for o in objects],
+        "sizes": [o["size"] for o in objects],
+        "updated": [o["updated"] for o in objects],
+        "content_types": [o["content_type"] for o in objects],
+    }
+
 
 @retry_on_gcp_transient_error
-def _get_job_sync(client: bigquery.Client, job_id: str, location: Optional[str]):
-    logger.debug(f"Running client get job thread {job_id} retry")
-    return client.get_job(job_id, location=location)
+def _upload_string_sync(client: storage.Client, bucket_name: str, object_path: str, content: str, content_type: str):
+    logger.debug("Running blob upload from string thread %s %s retry", bucket_name, object_path)
+    blob = client.bucket(bucket_name).blob(object_path)
+    blob.upload_from_string(content, content_type=content_type)
+    # Answer from inputs reading blob properties can trigger a lazy
+    # metadata GET when the upload response left an attribute unset
+    return object_path, bucket_name, len(content.encode("utf-8")), content_type
+
+
+# --- aiohttp fast path small uploads are one JSON media POST ---
+_aio_session: Optional["aiohttp.ClientSession"] = None
+
+
+def _get_aio_session() -> "aiohttp.ClientSession":
+    """Returns shared lazily built aiohttp session pooled keep alive"""
+    global _aio_session
+    if _aio_session is None or _aio_session.closed:
+        _aio_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+        )
+    return _aio_session
+
+
+def _refresh_credentials_sync(creds) -> None:
+    logger.debug("Refreshing GCS credentials thread")
+    import google.auth.transport.requests
+    creds.refresh(google.auth.transport.requests.Request())
+
+
+async def _get_access_token(client: storage.Client) -> str:
+    """Returns bearer token client credentials refreshed off loop if stale"""
+    creds = client._credentials
+    if not getattr(creds, "valid", False):
+        await _run_gcs(_refresh_credentials_sync, creds)
+    return creds.token
+
 
 @retry_on_gcp_transient_error
-def _list_rows_sync(client: bigquery.Client, job_id: str, location: Optional[str], page_token: Optional[str], max_results: int):
-     logger.debug(f"Running client list rows thread page job {job_id} retry")
-     rows_iterator = client.list_rows(job_id, location=location, page_token=page_token, max_results=max_results)
-     page_rows = list(rows_iterator) # Consume page
-     return rows_iterator.schema, page_rows, rows_iterator.next_page_token, rows_iterator.total_rows
+async def _upload_string_aio(client: storage.Client, bucket_name: str, object_path: str, content: str, content_type: str):
+    """Uploads small string media endpoint native async no executor hop
+
+    The blocking SDK path costs semaphore executor thread hops for what
+    is one authorized POST the event loop already does network waits
+    same transient retry policy as the sync path tenacity awaits its
+    sleeps on async functions the POST runs under the shared RPC
+    semaphore so aio uploads respect the same concurrency cap as the
+    executor path token refresh happens before acquiring it the refresh
+    helper takes its own permit nesting would deadlock under saturation
+    """
+    from urllib.parse import quote
+    token = await _get_access_token(client)
+    url = f"https://storage.googleapis.com/upload/storage/v1/b/{quote(bucket_name, safe='')}/o"
+    session = _get_aio_session()
+    async with _GCS_RPC_SEM:
+        async with session.post(
+            url,
+            params={"uploadType": "media", "name": object_path},
+            headers={"Authorization": f"Bearer {token}", "Content-Type": content_type},
+            data=content.encode("utf-8"),
+        ) as resp:
+            if resp.status >= 400:
+                raise google_exceptions.from_http_status(resp.status, await resp.text())
+            body = await resp.json()
+    return body.get("name", object_path), bucket_name, int(body.get("size", 0)), body.get("contentType", content_type)
+
+
+async def close_aio_session() -> None:
+    """Closes shared aiohttp session teardown"""
+    global _aio_session
+    if _aio_session is not None and not _aio_session.closed:
+        await _aio_session.close()
+    _aio_session = None
+
 
 # --- Tool Implementations Require explicit args ---
 
-async def bq_list_datasets( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Lists accessible BQ datasets"""
-    project_id = arguments.get("project_id"); # ... type validation ...
-    if project_id is not None and not isinstance(project_id, str): return format_error("Invalid project id must be string")
+async def gcs_list_buckets( arguments: Dict[str, Any], conn_id: str, **kwargs ) -> McpToolReturnType:
+    """Lists accessible GCS buckets"""
     try:
-        client = get_bq_client()
-        dataset_list, used_project = await asyncio.to_thread(_list_datasets_sync, client, project_id)
-        return format_success("Datasets listed", data={"project_id": used_project, "datasets": dataset_list})
-    except Exception as e: return handle_gcp_error(e, f"listing BQ datasets project {project_id or 'default'}")
-
-async def bq_list_tables( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Lists tables within required BQ dataset"""
-    project_id = arguments.get("project_id"); dataset_id = arguments.get("dataset_id")
-    if not project_id or not isinstance(project_id, str): return format_error("Missing invalid project id")
-    if not dataset_id or not isinstance(dataset_id, str): return format_error("Missing invalid dataset id")
-    try:
-        client = get_bq_client(); dataset_ref = bigquery.DatasetReference(project_id, dataset_id)
-        table_list = await asyncio.to_thread(_list_tables_sync, client, dataset_ref)
-        return format_success("Tables listed", data={"project_id": project_id, "dataset_id": dataset_id, "tables": table_list})
-    except Exception as e: return handle_gcp_error(e, f"listing BQ tables dataset {project_id}:{dataset_id}")
-
-async def bq_get_table_schema( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Gets schema required BQ table"""
-    project_id = arguments.get("project_id"); dataset_id = arguments.get("dataset_id"); table_id = arguments.get("table_id")
-    # Simplified validation assumes IDs are mandatory args now
-    if not project_id or not isinstance(project_id, str): return format_error("Missing invalid project id")
-    if not dataset_id or not isinstance(dataset_id, str): return format_error("Missing invalid dataset id")
-    if not table_id or not isinstance(table_id, str): return format_error("Missing invalid table id")
-    # Table ID parsing logic removed assumes simple table ID with required project/dataset args
-    if '.' in table_id: return format_error("Table id should be simple name project dataset provided separately")
+        client = get_storage_client()
+        bucket_list = await _run_gcs(_list_buckets_sync, client)
+        return format_success("Buckets listed", data={"buckets": bucket_list})
+    except Exception as e: return handle_gcp_error(e, "listing GCS buckets")
 
-    try:
-        client = get_bq_client(); table_ref_str = f"{project_id}.{dataset_id}.{table_id}"
-        table_ref = bigquery.TableReference.from_string(table_ref_str)
-        table = await asyncio.to_thread(_get_table_sync, client, table_ref)
-        schema_list = [{"name": f.name, "type": f.field_type, "mode": f.mode} for f in table.schema]
-        return format_success("Schema retrieved", data={"project_id": table.project, "dataset_id": table.dataset_id, "table_id": table.table_id, "schema": schema_list})
-    except google_exceptions.NotFound: return format_error(f"Table {table_ref_str} not found")
-    except Exception as e: return handle_gcp_error(e, f"getting schema table {table_ref_str}")
-
-async def bq_submit_query( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Submits BQ query job asynchronously returns job ID uses Firestore"""
-    query_str = arguments.get("query"); # ... validation ...
-    if not query_str or not isinstance(query_str, str): return format_error("Missing invalid query string")
-    project_id_arg = arguments.get("project_id"); # ... validation ...
-    default_project_id_arg = arguments.get("default_dataset_project_id"); # ... validation ...
-    default_dataset_id_arg = arguments.get("default_dataset_id"); # ... validation ...
-
-    target_project = project_id_arg # Project run job in
-    job_default_dataset_ref: Optional[bigquery.DatasetReference] = None
-    if default_project_id_arg and default_dataset_id_arg:
-         job_default_dataset_ref = bigquery.DatasetReference(default_project_id_arg, default_dataset_id_arg)
+
+async def gcs_list_objects( arguments: Dict[str, Any], conn_id: str, **kwargs ) -> McpToolReturnType:
+    """Lists objects directories required GCS bucket supports pagination"""
+    if msgspec is not None:
+        try: a = msgspec.convert(arguments, _ListObjectsArgs, strict=False)
+        except msgspec.ValidationError as e: return format_error(f"Invalid arguments {e}")
+        bucket_name = a.bucket_name; prefix = a.prefix; page_token = a.page_token
+        max_results = a.max_results; parallel = a.parallel; columnar = a.columnar
+        if not bucket_name: return format_error("Missing invalid bucket name")
+    else:
+        bucket_name = arguments.get("bucket_name"); # ... validation ...
+        if not bucket_name or not isinstance(bucket_name, str): return format_error("Missing invalid bucket name")
+        prefix = arguments.get("prefix"); page_token = arguments.get("page_token")
+        if prefix is not None and not isinstance(prefix, str): return format_error("Invalid prefix")
+        if page_token is not None and not isinstance(page_token, str): return format_error("Invalid page token")
+        try: max_results = int(arguments.get("max_results", 100))
+        except (ValueError, TypeError): max_results = 100
+        parallel = bool(arguments.get("parallel"))
+        columnar = bool(arguments.get("columnar"))
+    max_results = max(1, min(max_results, 1000))
 
     try:
-        client = get_bq_client();
-        if not target_project: target_project = client.project
-        job_config = bigquery.QueryJobConfig(use_legacy_sql=False);
-        if job_default_dataset_ref: job_config.default_dataset = job_default_dataset_ref
-        logger.info(f"Submitting BQ Job Project {target_project} Query {query_str[:50]}", extra={"conn_id": conn_id})
-        query_job = await asyncio.to_thread(_submit_job_sync, client, query_str, job_config, target_project)
-        job_id = query_job.job_id; location = query_job.location; initial_state = query_job.state
-        logger.info(f"BQ Job submitted {job_id} Location {location} State {initial_state}", extra={"conn_id": conn_id})
-        # --- Store Job Info Firestore ---
-        job_info = BqJobInfo(job_id=job_id, location=location, conn_id=conn_id, status=initial_state)
-        await bq_job_store.add_job(job_info) # Uses Firestore store now
-        # --------------------------------
-        return format_success("Query submitted Use bq get job status poll", data={"job_id": job_id, "location": location, "state": initial_state})
-    except google_exceptions.BadRequest as e: return handle_gcp_error(e, "submitting query BadRequest")
-    except google_exceptions.Forbidden as e: return handle_gcp_error(e, "submitting query Forbidden")
-    except Exception as e: return handle_gcp_error(e, f"submitting BQ query")
-
-async def bq_get_job_status( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Checks job status via Firestore if DONE Success fetches first page results"""
-    job_id = arguments.get("job_id"); # ... validation ...
-    if not job_id or not isinstance(job_id, str): return format_error("Missing invalid job id")
-    # Location arg is mainly for fallback API call if needed now
-    location_arg = arguments.get("location"); # ... validation ...
-
-    logger.debug(f"Getting job status from Firestore {job_id}", extra={"conn_id": conn_id})
-    job_info = await bq_job_store.get_job(job_id) # Reads from Firestore
-
-    if not job_info:
-        # Optional Fallback check BQ API directly if not found in Firestore
-        # logger.warning(f"Job {job_id} not found Firestore trying direct API lookup", extra={"conn_id": conn_id})
-        # try: client=get_bq_client(); job = await asyncio.to_thread(_get_job_sync, client, job_id, location_arg); job_info = BqJobInfo(...) # Reconstruct if needed
-        # except google_exceptions.NotFound: return format_error(...)
-        # except Exception as e: return handle_gcp_error(...)
-        # If still not found after fallback
-        return format_error(f"Job {job_id} not found tracked")
-
-    status_data = {"job_id": job_info.job_id, "location": job_info.location, "state": job_info.status, "error_result": job_info.error_result}
-
-    if job_info.status == 'DONE':
-        if job_info.error_result: return format_error(f"Job {job_id} finished errors", data=status_data)
+        client = get_storage_client()
+        if parallel and not page_token:
+            # Opt in fan out big prefixes pagination does not compose with
+            # merged ranges so the parallel path returns one merged slice
+            objects, prefixes = await _list_blobs_parallel(client, bucket_name, prefix, "/", max_results)
+            token = None
         else:
-            # --- Job Done Successfully Fetch FIRST page results ---
-            logger.info(f"Job {job_id} DONE Fetching first page results", extra={"conn_id": conn_id})
-            try:
-                client = get_bq_client(); max_results_first_page = 1000
-                # Use retry wrapped helper fetch page
-                schema, rows, token, total = await asyncio.to_thread(
-                    _list_rows_sync, client, job_id, job_info.location, None, max_results_first_page # page token None
-                )
-                schema_list = [{"name": f.name, "type": f.field_type} for f in schema]; rows_list = [_serialize_row(r) for r in rows]
-                status_data["schema"] = schema_list; status_data["rows"] = rows_list; status_data["next_page_token"] = token; status_data["total_rows"] = total
-                return format_success(f"Job {job_id} completed Returning first page results", data=status_data)
-            except Exception as e:
-                logger.error(f"Error fetching first page results completed job {job_id} {e}", exc_info=True, extra={"conn_id": conn_id})
-                # Return DONE status indicate result fetch error
-                return format_error(f"Job {job_id} completed but failed fetch first page results {e}", data = {**status_data, "rows": None, "schema": None, "next_page_token": None}) # type ignore
+            objects, prefixes, token = await _run_gcs(
+                _list_blobs_sync, client, bucket_name, prefix, "/", page_token, max_results
+            )
+        data: Dict[str, Any] = {"bucket_name": bucket_name, "prefix": prefix, "prefixes": prefixes, "next_page_token": token}
+        if columnar:
+            # Opt in SoA callers keeping the row shape pay nothing
+            data["columns"] = _objects_to_columns(objects)
+        else:
+            data["objects"] = objects
+        return format_success("Objects listed", data=data)
+    except google_exceptions.NotFound: return format_error(f"Bucket {bucket_name} not found")
+    except Exception as e: return handle_gcp_error(e, f"listing objects bucket {bucket_name}")
+
+
+async def gcs_get_read_signed_url( arguments: Dict[str, Any], conn_id: str, **kwargs ) -> McpToolReturnType:
+    """Generates short lived signed URL read GCS object HTTP GET"""
+    if msgspec is not None:
+        try: a = msgspec.convert(arguments, _SignedUrlArgs, strict=False)
+        except msgspec.ValidationError as e: return format_error(f"Invalid arguments {e}")
+        bucket_name = a.bucket_name; object_path = a.object_path; expires_in = a.expires_in_seconds
+        if not bucket_name: return format_error("Missing invalid bucket name")
+        if not object_path: return format_error("Missing invalid object path")
     else:
-        # Job PENDING or RUNNING
-        logger.info(f"Job {job_id} still {job_info.status}", extra={"conn_id": conn_id})
-        return format_info(f"Job {job_id} currently {job_info.status}", data=status_data)
-
-
-async def bq_get_query_results( arguments: Dict[str, Any], conn_id: str, bq_job_store: FirestoreBqJobStore, **kwargs ) -> McpToolReturnType:
-    """Fetches specific page results completed BQ query job requires page token"""
-    job_id = arguments.get("job_id"); page_token = arguments.get("page_token"); location_arg = arguments.get("location")
-    # Validation
-    if not job_id or not isinstance(job_id, str): return format_error("Missing invalid job id")
-    if not page_token or not isinstance(page_token, str): return format_error("Missing invalid required argument page token fetch subsequent pages")
-    if location_arg is not None and not isinstance(location_arg, str): return format_error("Invalid location")
-    try: max_results = int(arguments.get("max_results", 1000)); # ... range check ...
-    except (ValueError, TypeError): max_results = 1000
-
-    # Determine location argument > stored job info > error
-    location = location_arg
-    if not location:
-        job_info = await bq_job_store.get_job(job_id) # Read from Firestore
-        if job_info: location = job_info.location
-        else: return format_error(f"Cannot fetch results page Location job {job_id} unknown Please provide location")
-    if not location: return format_error(f"Cannot fetch results page Location job {job_id} could not be determined")
+        bucket_name = arguments.get("bucket_name"); object_path = arguments.get("object_path")
+        if not bucket_name or not isinstance(bucket_name, str): return format_error("Missing invalid bucket name")
+        if not object_path or not isinstance(object_path, str): return format_error("Missing invalid object path")
+        try: expires_in = int(arguments.get("expires_in_seconds", 300))
+        except (ValueError, TypeError): expires_in = 300
+    expires_in = max(1, min(expires_in, 604800)) # V4 cap 7 days
 
     try:
-        client = get_bq_client()
-        logger.debug(f"Getting results page BQ job {job_id} Loc {location} PageToken {page_token[:10]}", extra={"conn_id": conn_id})
-        # Fetch requested page retry wrapped helper
-        schema, rows, token, total = await asyncio.to_thread(
-            _list_rows_sync, client, job_id, location, page_token, max_results
+        client = get_storage_client()
+        url, validity = await _run_gcs(
+            _generate_signed_url_sync, client, bucket_name, object_path, "GET", expires_in
         )
-        schema_list = [{"name": f.name, "type": f.field_type} for f in schema]; rows_list = [_serialize_row(r) for r in rows]
-        return format_success("Query results page retrieved", data={"job_id": job_id, "location": location, "schema": schema_list, "rows": rows_list, "next_page_token": token, "total_rows": total})
-    except google_exceptions.NotFound: return format_error(f"Job {job_id} not found or invalid page token")
-    except Exception as e: return handle_gcp_error(e, f"getting results page job {job_id}")
-
-
-def _serialize_row(row: bigquery.table.Row) -> Dict[str, Any]:
-    """Helper convert BQ Row JSON serializable dict"""
-    row_dict = {}; # ... implementation unchanged ...
-    for key, value in row.items():
-         if isinstance(value, bytes):
-             try: row_dict[key] = value.decode('utf-8')
-             except UnicodeDecodeError: row_dict[key] = f"<bytes:{len(value)}>"
-         else: row_dict[key] = value
-    return row_dict
+        # Lean payload the validity window is authoritative clients
+        # compute wall clock expiry no datetime allocation per call
+        return format_success("Read signed URL generated", data={"bucket_name": bucket_name, "object_path": object_path, "signed_url": url, "method": "GET", "expires_in_seconds": validity})
+    except Exception as e: return handle_gcp_error(e, f"generating read signed URL {bucket_name}/{object_path}")
+
+
+async def gcs_get_write_signed_url( arguments: Dict[str, Any], conn_id: str, **kwargs ) -> McpToolReturnType:
+    """Generates short lived signed URL write GCS object HTTP PUT"""
+    if msgspec is not None:
+        try: a = msgspec.convert(arguments, _SignedUrlArgs, strict=False)
+        except msgspec.ValidationError as e: return format_error(f"Invalid arguments {e}")
+        bucket_name = a.bucket_name; object_path = a.object_path
+        content_type = a.content_type; expires_in = a.expires_in_seconds
+        if not bucket_name: return format_error("Missing invalid bucket name")
+        if not object_path: return format_error("Missing invalid object path")
+    else:
+        bucket_name = arguments.get("bucket_name"); object_path = arguments.get("object_path")
+        if not bucket_name or not isinstance(bucket_name, str): return format_error("Missing invalid bucket name")
+        if not object_path or not isinstance(object_path, str): return format_error("Missing invalid object path")
+        content_type = arguments.get("content_type")
+        if content_type is not None and not isinstance(content_type, str): return format_error("Invalid content type")
+        try: expires_in = int(arguments.get("expires_in_seconds", 300))
+        except (ValueError, TypeError): expires_in = 300
+    expires_in = max(1, min(expires_in, 604800)) # V4 cap 7 days
+
+    try:
+        client = get_storage_client()
+        url, validity = await _run_gcs(
+            _generate_signed_url_sync, client, bucket_name, object_path, "PUT", expires_in, content_type
+        )
+        return format_success("Write signed URL generated", data={"bucket_name": bucket_name, "object_path": object_path, "signed_url": url, "method": "PUT", "content_type": content_type, "expires_in_seconds": validity})
+    except Exception as e: return handle_gcp_error(e, f"generating write signed URL {bucket_name}/{object_path}")
+
+
+async def gcs_write_string_object( arguments: Dict[str, Any], conn_id: str, **kwargs ) -> McpToolReturnType:
+    """Writes small string content directly GCS size checked signed URLs bigger"""
+    if msgspec is not None:
+        try: a = msgspec.convert(arguments, _WriteStringArgs, strict=False)
+        except msgspec.ValidationError as e: return format_error(f"Invalid arguments {e}")
+        bucket_name = a.bucket_name; object_path = a.object_path; content = a.content
+        if not bucket_name: return format_error("Missing invalid bucket name")
+        if not object_path: return format_error("Missing invalid object path")
+    else:
+        bucket_name = arguments.get("bucket_name"); object_path = arguments.get("object_path"); content = arguments.get("content")
+        if not bucket_name or not isinstance(bucket_name, str): return format_error("Missing invalid bucket name")
+        if not object_path or not isinstance(object_path, str): return format_error("Missing invalid object path")
+        if content is None or not isinstance(content, str): return format_error("Missing invalid content string")
+    content_size = len(content.encode("utf-8"))
+    if content_size > MAX_STRING_UPLOAD_BYTES:
+        return format_error(f"Content {content_size} bytes exceeds direct upload cap {MAX_STRING_UPLOAD_BYTES} use gcs get write signed url")
+
+    try:
+        client = get_storage_client()
+        if aiohttp is not None:
+            name, bucket, size, content_type = await _upload_string_aio(
+                client, bucket_name, object_path, content, "text/plain"
+            )
+        else:
+            name, bucket, size, content_type = await _run_gcs(
+                _upload_string_sync, client, bucket_name, object_path, content, "text/plain"
+            )
+        return format_success("Object written", data={"bucket_name": bucket, "object_path": name, "size": size, "content_type": content_type})
+    except google_exceptions.NotFound: return format_error(f"Bucket {bucket_name} not found")
+    except Exception as e: return handle_gcp_error(e, f"writing string object {bucket_name}/{object_path}")
@@ -0,0 +1,340 @@
+"""
+Firestore backed persistence BQ job state v1 0 0 stateless design
+FirestoreBqJobStore stores one document per submitted BQ job collection
+mcp_bq_jobs keyed job_id survives agent restarts scaled instances
+"""
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+from google.api_core import exceptions as google_exceptions
+
+# Import retry decorator shared GCP sync helpers
+from .utils import retry_on_gcp_transient_error
+
+logger = logging.getLogger("mcp_agent.job_store")
+
+# Collection name holding BQ job documents
+BQ_JOBS_COLLECTION = "mcp_bq_jobs"
+# States considered still in flight poller keeps checking these
+NON_TERMINAL_STATES = ("PENDING", "RUNNING")
+# Starting per job poll backoff seconds poller grows this cap poll interval
+POLL_BACKOFF_START_SECONDS = 2.0
+# get_job read cache TTLs short while in flight longer once terminal a
+# DONE ERROR job never changes again bounded staleness only for live jobs
+JOB_CACHE_TTL_SECONDS = 30.0
+JOB_CACHE_TTL_TERMINAL_SECONDS = 300.0
+JOB_CACHE_MAX_ENTRIES = 4096
+# add_job micro batching window threshold submits arriving together
+# share one WriteBatch commit instead of one RPC each
+ADD_BUFFER_FLUSH_SECONDS = 0.05
+ADD_BUFFER_FLUSH_THRESHOLD = 50
+
+
+def _utcnow() -> datetime:
+    """Timezone aware UTC now Firestore stores aware datetimes"""
+    return datetime.now(timezone.utc)
+
+
+def status_update_fields(status: str, error_result: Optional[Dict[str, Any]] = None, etag: Optional[str] = None) -> Dict[str, Any]:
+    """Builds field dict status transition write shared single bulk paths"""
+    now = _utcnow()
+    fields: Dict[str, Any] = {"status": status, "updated_time": now, "last_polled_at": now}
+    if status in NON_TERMINAL_STATES:
+        # Transition resets adaptive backoff poll again soon
+        fields["poll_backoff"] = POLL_BACKOFF_START_SECONDS
+        fields["next_poll_at"] = now + timedelta(seconds=POLL_BACKOFF_START_SECONDS)
+    if error_result is not None:
+        fields["error_result"] = error_result
+    if etag is not None:
+        fields["last_bq_etag"] = etag
+    return fields
+
+
+def poll_update_fields(etag: Optional[str] = None, poll_backoff: Optional[float] = None) -> Dict[str, Any]:
+    """Builds field dict poll bookkeeping write shared single bulk paths"""
+    now = _utcnow()
+    fields: Dict[str, Any] = {"last_polled_at": now}
+    if etag is not None:
+        fields["last_bq_etag"] = etag
+    if poll_backoff is not None:
+        fields["poll_backoff"] = poll_backoff
+        fields["next_poll_at"] = now + timedelta(seconds=poll_backoff)
+    return fields
+
+
+@dataclass(slots=True)
+class BqJobInfo:
+    """Represents tracked BQ job state persisted Firestore
+
+    Slots layout instances are created per pending job every poll cycle
+    dict less objects cost roughly half the memory attribute access skips
+    the instance dict lookup
+    """
+    job_id: str
+    location: Optional[str] = None
+    conn_id: Optional[str] = None
+    status: str = "PENDING"
+    error_result: Optional[Dict[str, Any]] = None
+    created_time: datetime = field(default_factory=_utcnow)
+    updated_time: datetime = field(default_factory=_utcnow)
+    # Poller bookkeeping skip redundant BQ reads Firestore writes
+    last_bq_etag: Optional[str] = None
+    last_polled_at: Optional[datetime] = None
+    # Adaptive per job poll scheduling short jobs polled fast long jobs backed off
+    next_poll_at: datetime = field(default_factory=_utcnow)
+    poll_backoff: float = POLL_BACKOFF_START_SECONDS
+
+    def to_firestore_dict(self) -> Dict[str, Any]:
+        """Converts dataclass plain dict Firestore document payload"""
+        return asdict(self)
+
+    @classmethod
+    def from_firestore_dict(cls, data: Dict[str, Any]) -> "BqJobInfo":
+        """Builds BqJobInfo Firestore document dict ignores unknown fields"""
+        known = {f for f in cls.__dataclass_fields__}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+class FirestoreBqJobStore:
+    """Encapsulates Firestore interactions BQ job persistence add get update query"""
+
+    def __init__(self, project: Optional[str] = None, credentials: Optional[Any] = None):
+        self._project = project
+        self._credentials = credentials
+        self._db: Optional[firestore.Client] = None
+        self._db_lock = threading.Lock()
+        # Invariant part pending query built once rebound per cycle cursor
+        self._pending_base_query = None
+        # Read cache poll heavy clients hammer get_job between transitions
+        # populated by writes this process makes refreshed on real reads
+        self._job_cache: "OrderedDict[str, Tuple[float, BqJobInfo]]" = OrderedDict()
+        # add_job micro batch buffer one flush task per window callers
+        # await the shared flush durability semantics unchanged
+        self._add_buffer: List[BqJobInfo] = []
+        self._add_flush_task: Optional["asyncio.Task"] = None
+        self._add_flush_wakeup = asyncio.Event()
+        logger.info("FirestoreBqJobStore created", extra={"collection": BQ_JOBS_COLLECTION})
+
+    def _get_db(self) -> firestore.Client:
+        """Initializes returns cached Firestore client uses ADC
+
+        Double checked lock sync helpers run on threads first concurrent
+        touch must not race N client inits
+        """
+        if self._db is None:
+            with self._db_lock:
+                if self._db is not None:
+                    return self._db
+                logger.info("Initializing Google Cloud Firestore client")
+                try:
+                    self._db = firestore.Client(project=self._project, credentials=self._credentials)
+                    logger.info("Firestore client initialized successfully")
+                except Exception as e:
+                    logger.critical(f"Failed to initialize Firestore client {e}", exc_info=True)
+                    raise RuntimeError(f"Firestore client initialization failed {e}") from e
+        return self._db
+
+    def _collection(self):
+        return self._get_db().collection(BQ_JOBS_COLLECTION)
+
+    # --- Retry wrapped sync helpers run via asyncio.to_thread ---
+    @retry_on_gcp_transient_error
+    def _set_doc_sync(self, job_info: BqJobInfo) -> None:
+        logger.debug(f"Writing job doc Firestore {job_info.job_id} retry")
+        self._collection().document(job_info.job_id).set(job_info.to_firestore_dict())
+
+    @retry_on_gcp_transient_error
+    def _get_doc_sync(self, job_id: str) -> Optional[Dict[str, Any]]:
+        logger.debug(f"Reading job doc Firestore {job_id} retry")
+        snapshot = self._collection().document(job_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    @retry_on_gcp_transient_error
+    def _update_doc_sync(self, job_id: str, fields: Dict[str, Any]) -> None:
+        logger.debug(f"Updating job doc Firestore {job_id} retry")
+        self._collection().document(job_id).update(fields)
+
+    def _pending_query(self, limit: int):
+        """Binds fresh cursor limit onto cached invariant pending query
+
+        Firestore queries are immutable where returns derived query so the
+        status filter order_by pair is constructed once hoisted out the
+        per cycle hot path only the time cursor limit rebind each call
+        """
+        if self._pending_base_query is None:
+            self._pending_base_query = (
+                self._collection()
+                .where("status", "in", list(NON_TERMINAL_STATES))
+                .order_by("next_poll_at")
+            )
+        return self._pending_base_query.where("next_poll_at", "<=", _utcnow()).limit(limit)
+
+    @retry_on_gcp_transient_error
+    def _query_pending_sync(self, limit: int) -> List[Dict[str, Any]]:
+        # Requires composite index (status, next_poll_at) index scan not
+        # collection scan only jobs due now are returned
+        logger.debug(f"Querying pending job docs Firestore limit {limit} retry")
+        return [snap.to_dict() for snap in self._pending_query(limit).stream()]
+
+    def _cache_job(self, job_info: BqJobInfo) -> None:
+        """Caches job info TTL keyed on terminal vs live LRU bounded"""
+        ttl = JOB_CACHE_TTL_SECONDS if job_info.status in NON_TERMINAL_STATES else JOB_CACHE_TTL_TERMINAL_SECONDS
+        self._job_cache[job_info.job_id] = (monotonic() + ttl, job_info)
+        self._job_cache.move_to_end(job_info.job_id)
+        while len(self._job_cache) > JOB_CACHE_MAX_ENTRIES:
+            self._job_cache.popitem(last=False)
+
+    @retry_on_gcp_transient_error
+    def _set_docs_batch_sync(self, job_infos: List[BqJobInfo]) -> None:
+        logger.debug("Writing %d job docs Firestore one batch retry", len(job_infos))
+        batch = self._get_db().batch()
+        for job_info in job_infos:
+            batch.set(self._collection().document(job_info.job_id), job_info.to_firestore_dict())
+        batch.commit()
+
+    async def _flush_adds_soon(self) -> None:
+        """Flushes buffered adds after the window or on early wakeup"""
+        try:
+            await asyncio.wait_for(self._add_flush_wakeup.wait(), ADD_BUFFER_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._add_flush_wakeup = asyncio.Event()
+        buffered, self._add_buffer = self._add_buffer, []
+        self._add_flush_task = None
+        if len(buffered) == 1:
+            await asyncio.to_thread(self._set_doc_sync, buffered[0])
+        elif buffered:
+            await asyncio.to_thread(self._set_docs_batch_sync, buffered)
+
+    # --- Async API consumed tools poller ---
+    async def add_job(self, job_info: BqJobInfo) -> None:
+        """Persists new job document Firestore adds arriving together batch
+
+        Each caller still awaits the commit covering its own doc so the
+        durability contract holds a submit burst costs one WriteBatch RPC
+        per 50ms window not one write RPC per job threshold fills flush
+        immediately
+        """
+        self._add_buffer.append(job_info)
+        self._cache_job(job_info)
+        if self._add_flush_task is None:
+            self._add_flush_task = asyncio.ensure_future(self._flush_adds_soon())
+        if len(self._add_buffer) >= ADD_BUFFER_FLUSH_THRESHOLD:
+            self._add_flush_wakeup.set()
+        # Shield one cancelled caller must not abort the shared flush
+        await asyncio.shield(self._add_flush_task)
+        logger.info(f"Job {job_info.job_id} added store", extra={"conn_id": job_info.conn_id, "status": job_info.status})
+
+    async def get_job(self, job_id: str, force_refresh: bool = False) -> Optional[BqJobInfo]:
+        """Fetches tracked job cache then Firestore returns None unknown job
+
+        Polling clients re read the same doc every second or two within
+        the TTL window those reads never leave the process force_refresh
+        bypasses straight to Firestore
+        """
+        if not force_refresh:
+            entry = self._job_cache.get(job_id)
+            if entry is not None and entry[0] > monotonic():
+                return entry[1]
+        data = await asyncio.to_thread(self._get_doc_sync, job_id)
+        if data is None:
+            self._job_cache.pop(job_id, None)
+            return None
+        job_info = BqJobInfo.from_firestore_dict(data)
+        self._cache_job(job_info)
+        return job_info
+
+    async def update_job_status(self, job_id: str, status: str, error_result: Optional[Dict[str, Any]] = None, etag: Optional[str] = None) -> None:
+        """Updates status error result updated time tracked job"""
+        fields = status_update_fields(status, error_result=error_result, etag=etag)
+        try:
+            await asyncio.to_thread(self._update_doc_sync, job_id, fields)
+            logger.info(f"Job {job_id} status updated {status}")
+        except google_exceptions.NotFound:
+            self._job_cache.pop(job_id, None)
+            logger.warning(f"Job {job_id} vanished before status update {status}")
+            return
+        entry = self._job_cache.get(job_id)
+        if entry is not None:
+            # Refresh cached copy in place new status keeps reads warm
+            self._cache_job(replace(entry[1], status=status, error_result=error_result if error_result is not None else entry[1].error_result, updated_time=fields["updated_time"]))
+
+    async def record_poll(self, job_id: str, etag: Optional[str], poll_backoff: Optional[float] = None) -> None:
+        """Records poll bookkeeping only no status change cheap write"""
+        fields = poll_update_fields(etag=etag, poll_backoff=poll_backoff)
+        try:
+            await asyncio.to_thread(self._update_doc_sync, job_id, fields)
+        except google_exceptions.NotFound:
+            logger.warning(f"Job {job_id} vanished before poll bookkeeping write")
+
+    @contextmanager
+    def open_bulk(self):
+        """Yields Firestore BulkWriter pipelined concurrent batch commits
+
+        BulkWriter keeps several 500 write batches in flight at once with
+        its own rate limiting retries so many cycle worth of terminal
+        writes cost overlapping RTTs not sequential commits
+        """
+        bw = self._get_db().bulk_writer()
+        try:
+            yield bw
+        finally:
+            # Flushes remaining mutations waits outstanding batches
+            bw.close()
+
+    @retry_on_gcp_transient_error
+    def _bulk_update_sync(self, updates: List) -> None:
+        if len(updates) > 500:
+            # Beyond one batch BulkWriter pipelines commits concurrently a
+            # chunked WriteBatch loop would serialize the round trips
+            with self.open_bulk() as bw:
+                for job_id, fields in updates:
+                    bw.set(self._collection().document(job_id), fields, merge=True)
+            return
+        # Firestore WriteBatch caps 500 writes single commit covers the set
+        batch = self._get_db().batch()
+        for job_id, fields in updates:
+            batch.set(self._collection().document(job_id), fields, merge=True)
+        batch.commit()
+
+    async def bulk_update(self, updates: List) -> None:
+        """Commits many (job_id, fields) updates few batched RPCs
+
+        One WriteBatch commit replaces N individual update round trips per
+        poll cycle Firestore write QPS is the scale bottleneck
+        """
+        if not updates:
+            return
+        await asyncio.to_thread(self._bulk_update_sync, updates)
+        logger.debug(f"Bulk committed {len(updates)} job updates")
+
+    async def query_pending_jobs(self, limit: int = 50) -> List[BqJobInfo]:
+        """Returns jobs non terminal state oldest updated first consumed poller"""
+        docs = await asyncio.to_thread(self._query_pending_sync, limit)
+        return [BqJobInfo.from_firestore_dict(d) for d in docs]
+
+    def close(self) -> None:
+        """Closes underlying Firestore client drains buffered adds first"""
+        if self._add_buffer:
+            try:
+                self._set_docs_batch_sync(self._add_buffer)
+            except Exception as e:
+                logger.warning(f"Error draining buffered job adds on close {e}")
+            self._add_buffer = []
+        if self._db is not None:
+            try:
+                self._db.close()
+                logger.info("Firestore client closed")
+            except Exception as e:
+                logger.warning(f"Error closing Firestore client {e}")
+            self._db = None
+            self._pending_base_query = None
+            self._job_cache.clear()
@@ -1,133 +1,338 @@
-import argparse
+"""
+MCP server transports version 1 0 0 Stateless STDIO SSE dispatch layer
+CLI entry lives in the cli module this module only serves
+"""
 import asyncio
+import functools
+import hmac
+import json
 import logging
+import signal
 import sys
 import os
-from typing import Set
-from dotenv import load_dotenv
-from pythonjsonlogger import jsonlogger
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiohttp import web
+from aiohttp_sse import sse_response
+from mcp import types as mcp_types
+
+# Optional fast JSON transport hot path parse serialize orjson first a
+# pooled msgspec encoder decoder second stdlib last the msgspec objects
+# are built once module scope not per message
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=str).decode()
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=str)
+elif msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=str)
+    # DecodeError subclasses ValueError the worker parse guard holds
+    _json_loads = msgspec.json.Decoder().decode
+    def _json_dumps(obj: Any) -> str:
+        return _msgspec_encoder.encode(obj).decode()
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return _msgspec_encoder.encode(obj)
+else:
+    _json_loads = json.loads
+    def _json_dumps(obj: Any) -> str:
+        return json.dumps(obj, default=str)
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, default=str).encode("utf-8")
 
 # Attempt relative import first
 try:
-    from .server import run_stdio_server, run_sse_server
-    from .gcp_tools.storage import get_storage_client
-    from .gcp_tools.bigquery import get_bq_client
-    from .utils import get_secret_manager_client, fetch_secret
-    from .job_store import FirestoreBqJobStore # Use Firestore store
+    from . import gcp_tools
+    from .utils import handle_gcp_error
 except ImportError:
      # Fallback running script directly
      import os; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-     from mcp_agent.server import run_stdio_server, run_sse_server
-     from mcp_agent.gcp_tools.storage import get_storage_client
-     from mcp_agent.gcp_tools.bigquery import get_bq_client
-     from mcp_agent.utils import get_secret_manager_client, fetch_secret
-     from mcp_agent.job_store import FirestoreBqJobStore
-
-
-# --- Configure Logging JSON Formatter ---
-root_logger = logging.getLogger(); logHandler = logging.StreamHandler(sys.stderr)
-formatter = jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(name)s %(message)s %(pathname)s %(lineno)d')
-logHandler.setFormatter(formatter); root_logger.handlers.clear(); root_logger.addHandler(logHandler)
-root_logger.setLevel(logging.INFO); logger = logging.getLogger("mcp_agent.cli")
-# --- End Logging Setup ---
-
-# Create instance Firestore store enable pre flight check
-# Note This assumes default Firestore database project
-_firestore_job_store = FirestoreBqJobStore()
-
-def parse_args():
-    """Parses command line arguments MCP agent server"""
-    parser = argparse.ArgumentParser(
-        description="Run MCP Agent server GCS BQ v1 0 0 Stateless Firestore BQ Jobs", # Updated
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
-    parser.add_argument("--tools", type=str, required=True, help="Comma separated storage bigquery")
-    parser.add_argument("--port", type=str, required=True, help="Connection mode stdio or SSE port number")
-    parser.add_argument("--host", type=str, default="127.0.0.1", help="SSE Only Host address Use 0 0 0 0 network access")
-    parser.add_argument("--require-api-key", action='store_true', help="SSE Only Enable API key auth Reads MCP AGENT API KEY SECRET NAME then MCP AGENT API KEY")
-    parser.add_argument("--debug", action="store_true", help="Enable verbose debug logging")
-    return parser.parse_args()
-
-def main() -> None:
-    """Main entry point mcp agent command line tool"""
-    dotenv_path = load_dotenv() # Load env file early
-    if dotenv_path: logger.info("Loaded env vars from env file", extra={'dotenv_path': dotenv_path})
-    else: logger.info("No env file found")
-    args = parse_args()
-    # --- Setup Logging Level ---
-    log_level = logging.DEBUG if args.debug else logging.INFO # ... set levels ...
-    logging.getLogger("mcp_agent").setLevel(log_level); # ... other logger levels ...
-    if args.debug: logger.debug("Debug logging enabled")
-    else: logging.getLogger("google").setLevel(logging.WARNING); logging.getLogger("mcp").setLevel(logging.INFO)
-
-    # --- Validate Tools ---
-    try: enabled_tools: Set[str] = set(t.strip().lower() for t in args.tools.split(',') if t.strip())
-    except Exception: logger.critical("Invalid tools format"); sys.exit(1)
-    valid_tools = {"storage", "bigquery"}; invalid_tools = enabled_tools - valid_tools
-    if invalid_tools: logger.critical(f"Invalid tools {invalid_tools} Allowed {valid_tools}"); sys.exit(1)
-    if not enabled_tools: logger.critical("No tools specified"); sys.exit(1)
-    logger.info(f"Configuring mcp agent server v1 0 0", extra={"enabled_tools": list(enabled_tools)})
-
-    # --- Determine API Key Secret Manager integration ---
-    api_key_to_use: Optional[str] = None; secret_source: str = "None"
-    if args.port.lower() != "stdio" and args.require_api_key:
-        secret_name_var = os.getenv('MCP_AGENT_API_KEY_SECRET_NAME'); direct_key_var = os.getenv('MCP_AGENT_API_KEY')
-        if secret_name_var:
-            logger.info("Attempting fetch API key Secret Manager", extra={"secret_name": secret_name_var})
-            try:
-                # Fetch secret uses retry internally now
-                api_key_to_use = fetch_secret(secret_name_var)
-                if api_key_to_use: secret_source = "Secret Manager"; logger.info("Successfully fetched API key Secret Manager")
-                else: logger.critical(f"FATAL Failed fetch API key Secret Manager {secret_name_var}"); sys.exit(1)
-            except Exception as sm_err: logger.critical(f"FATAL Error Secret Manager access {sm_err}", exc_info=args.debug); sys.exit(1)
-        elif direct_key_var:
-            logger.info("Using API key MCP AGENT API KEY environment variable"); api_key_to_use = direct_key_var; secret_source = "Environment Variable"
-        else: logger.critical("FATAL require api key flag set but neither secret name nor direct key env var set"); sys.exit(1)
-        logger.info(f"API Key Authentication Enabled Source {secret_source}")
-    elif args.port.lower() != "stdio": logger.info("API Key Authentication Disabled")
-    # --- End API Key Handling ---
-
-    # --- Pre flight Check GCP Clients Add Firestore ---
+     from mcp_agent import gcp_tools
+     from mcp_agent.utils import handle_gcp_error
+
+logger = logging.getLogger("mcp_agent.server")
+
+# Connection id rides a ContextVar set once per session request a
+# logging filter stamps it onto records call sites drop the per line
+# extra dict build tasks created under the context inherit it
+conn_id_var: ContextVar[str] = ContextVar("conn_id", default="-")
+
+
+class _ConnIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.conn_id = conn_id_var.get()
+        return True
+
+
+logger.addFilter(_ConnIdFilter())
+
+# --- Server Transports STDIO SSE ---
+
+# Shared Firestore job store transports BQ async jobs lazily created
+_bq_job_store = None
+
+
+def _get_job_store():
+    """Returns shared FirestoreBqJobStore transports lazily created"""
+    global _bq_job_store
+    if _bq_job_store is None:
+        from .job_store import FirestoreBqJobStore
+        _bq_job_store = FirestoreBqJobStore()
+    return _bq_job_store
+
+
+def set_job_store(store) -> None:
+    """Injects process wide job store transports share caller's instance
+
+    CLIs that already built a store shared credentials poller wiring
+    hand it over here one Firestore channel serves pre flight poller
+    and tool dispatch instead of one per component
+    """
+    global _bq_job_store
+    _bq_job_store = store
+
+
+def _error_contents(message: str) -> List[mcp_types.Content]:
+    return [mcp_types.TextContent(type="text", text=_json_dumps({"status": "error", "message": message}))]
+
+
+# Constant payload rejections serialized once returned by reference the
+# malformed input path pays zero encodes allocations callers never
+# mutate returned contents
+_MISSING_TOOL_NAME_RESP = _error_contents("Missing tool_name in request")
+_BAD_ARGUMENTS_RESP = _error_contents("Invalid arguments must be object")
+_STORAGE_DISABLED_RESP = _error_contents("Storage tools not enabled this server")
+_BQ_DISABLED_RESP = _error_contents("BigQuery tools not enabled this server")
+
+
+@functools.lru_cache(maxsize=256)
+def _unknown_tool_response(tool_name: str) -> List[mcp_types.Content]:
+    return _error_contents(f"Tool {tool_name} not recognized")
+
+
+# Tool name to service group built once from the registry name tuples
+# one dict hit replaces two prefix scans per call
+_TOOL_SERVICE: Dict[str, str] = (
+    {name: "storage" for name in gcp_tools._GCS_TOOL_NAMES}
+    | {name: "bigquery" for name in gcp_tools._BQ_TOOL_NAMES}
+)
+_SERVICE_DISABLED_RESP = {"storage": _STORAGE_DISABLED_RESP, "bigquery": _BQ_DISABLED_RESP}
+
+
+async def dispatch_tool(message: Dict[str, Any], conn_id: str, enabled_tools: Iterable[str]) -> List[mcp_types.Content]:
+    """Dispatches one parsed MCP message registered tool returns contents
+
+    Validates tool name enabled service membership then hands the call
+    the registry unknown names errors come back as standard error
+    payloads never exceptions
+    """
+    tool_name = message.get("tool_name")
+    if not tool_name:
+        logger.warning("Missing tool name in request")
+        return _MISSING_TOOL_NAME_RESP
+    arguments = message.get("arguments") or {}
+    if not isinstance(arguments, dict):
+        return _BAD_ARGUMENTS_RESP
+    service = _TOOL_SERVICE.get(tool_name)
+    if service is None:
+        logger.warning("Unknown tool requested %s", tool_name)
+        return _unknown_tool_response(tool_name)
+    if service not in enabled_tools:
+        return _SERVICE_DISABLED_RESP[service]
+    if tool_name not in gcp_tools.ALL_TOOL_NAMES:
+        # Known name whose optional implementation did not register
+        logger.warning("Unregistered tool requested %s", tool_name)
+        return _unknown_tool_response(tool_name)
     try:
-        logger.info("Performing pre flight GCP client initialization check")
-        clients_to_init = []
-        if "storage" in enabled_tools: clients_to_init.append(get_storage_client)
-        if "bigquery" in enabled_tools:
-             clients_to_init.append(get_bq_client)
-             # Add Firestore check if BQ enabled
-             clients_to_init.append(_firestore_job_store._get_db) # Use internal method force init
-        if args.port.lower() != "stdio" and args.require_api_key and os.getenv('MCP_AGENT_API_KEY_SECRET_NAME'):
-             clients_to_init.append(get_secret_manager_client)
-        # Run initializations sequentially allow easier debug failure
-        for init_func in clients_to_init:
-            if asyncio.iscoroutinefunction(init_func): asyncio.run(init_func()) # Run async init checks synchronously startup
-            else: init_func()
-        logger.info("GCP client pre flight check successful")
+        # Resolve the job store only for BigQuery calls a storage only
+        # server never imports Firestore nor builds a store it cannot use
+        if service == "bigquery":
+            return await gcp_tools.dispatch(tool_name, arguments, conn_id, bq_job_store=_get_job_store())
+        return await gcp_tools.dispatch(tool_name, arguments, conn_id)
     except Exception as e:
-        logger.critical("FATAL GCP client check failed", extra={"error": str(e)}, exc_info=args.debug)
-        logger.critical("Check ADC credentials API enablement GCS BQ Firestore SecretManager network IAM roles Firestore User Admin")
-        sys.exit(1)
-    # --- End Pre flight Check ---
-
-    # --- Start Server ---
-    loop = asyncio.get_event_loop(); main_task = None
-    server_mode = "STDIO" if args.port.lower() == "stdio" else f"SSE on {args.host}:{args.port}"
-    try:
-        if args.port.lower() == "stdio":
-            if args.require_api_key: logger.warning("API key requirement ignored stdio mode")
-            logger.info(f"Starting server {server_mode} mode")
-            main_task = loop.create_task(run_stdio_server(enabled_tools))
-        else: # SSE Mode
+        # Single error path one response shape import already paid
+        return handle_gcp_error(e, f"executing tool {tool_name}")
+
+
+# STDIO dispatch concurrency queue depth workers env overridable the
+# tools are pure I O coroutines serial awaits head of line block them
+_STDIO_WORKERS = int(os.environ.get("MCP_WORKERS", "8"))
+_STDIO_QUEUE_MAXSIZE = 64
+
+
+async def run_stdio_server(enabled_tools: Iterable[str]) -> None:
+    """Serves MCP over STDIO newline delimited JSON messages
+
+    stdin rides a StreamReader wired via connect_read_pipe reads await
+    directly on the loop no per line executor thread handoff context
+    switch Future churn stdout goes through a StreamWriter from
+    connect_write_pipe writes respect flow control never block the loop
+
+    Dispatch fans out a bounded queue N workers independent tool calls
+    run concurrently instead of serializing on one connection a writer
+    lock keeps per message framing atomic EOF pushes one sentinel per
+    worker the pool drains cleanly
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    protocol = asyncio.StreamReaderProtocol(reader)
+    await loop.connect_read_pipe(lambda: protocol, sys.stdin)
+    w_transport, w_protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    writer = asyncio.StreamWriter(w_transport, w_protocol, reader, loop)
+    conn_id = f"stdio-{os.getpid()}"
+    token = conn_id_var.set(conn_id)
+    logger.info("STDIO server started", extra={"enabled_tools": list(enabled_tools), "workers": _STDIO_WORKERS})
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_STDIO_QUEUE_MAXSIZE)
+    stdout_lock = asyncio.Lock()
+
+    async def _worker():
+        while True:
+            line = await queue.get()
+            if line is None:
+                return
             try:
-                port_num = int(args.port); # ... validate port range ...
-                if not (1024 <= port_num <= 65535): raise ValueError("Port out range")
-                logger.info(f"Starting server {server_mode} mode")
-                main_task = loop.create_task(run_sse_server(enabled_tools, args.host, port_num, api_key_to_use))
-            except ValueError as e: logger.critical(f"Invalid port {args.port} {e}"); sys.exit(1)
-        if main_task: loop.run_until_complete(main_task)
-    except KeyboardInterrupt: logger.info("Server interrupted Ctrl C Shutting down")
-    except Exception as e: logger.critical(f"Unexpected error running server {e}", exc_info=args.debug)
-    finally: logger.info("Server shutdown process complete"); sys.exit(0) # Explicit exit
-
-if __name__ == "__main__":
-    main()
+                message = _json_loads(line)
+            except ValueError as e:
+                response_contents = [mcp_types.TextContent(type="text", text=_json_dumps({"status": "error", "message": f"Invalid JSON message {e}"}))]
+            else:
+                response_contents = await dispatch_tool(message, conn_id, enabled_tools)
+            # One buffer one write one drain per message not per content
+            # each write is its own syscall on the pipe batching collapses
+            # N content frames into a single kernel crossing
+            out = b"".join(_json_dumps_bytes(content.model_dump()) + b"\n" for content in response_contents)
+            async with stdout_lock:
+                writer.write(out)
+                await writer.drain()
+
+    workers = [asyncio.ensure_future(_worker()) for _ in range(_STDIO_WORKERS)]
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                logger.info("STDIN closed shutting down STDIO server")
+                break
+            line = line.strip()
+            if not line:
+                continue
+            # Gate the slice extra dict build themselves not just the
+            # format %-style already defers that per message allocations
+            # vanish when debug is off
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received STDIO message %s", line[:200])
+            await queue.put(line)
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        conn_id_var.reset(token)
+
+
+async def handle_mcp_sse_request(request: "web.Request") -> "web.StreamResponse":
+    """Handles one MCP request SSE response events one per content"""
+    conn_id = request.headers.get("X-Connection-ID") or str(uuid.uuid4())
+    token = conn_id_var.set(conn_id)
+    try:
+        logger.info("SSE request received %s", request.remote, extra={"path": request.path})
+        if logger.isEnabledFor(logging.DEBUG):
+            # Full header dump debug only dict(CIMultiDict) allocates per
+            # request and mostly repeats the same proxy boilerplate
+            logger.debug("SSE request headers %s", dict(request.headers))
+        try:
+            message = await request.json()
+        except Exception as e:
+            logger.warning("Invalid JSON body SSE request %s", e)
+            raise web.HTTPBadRequest(text="Invalid JSON body")
+        response_contents = await dispatch_tool(message, conn_id, request.app["enabled_tools"])
+        async with sse_response(request) as sse_resp:
+            # One aggregated event per response each content is one data line
+            # within it N sends were N TCP writes N event framings the burst
+            # collapses into a single write single flush
+            payload_str = "\n".join(_json_dumps(content_obj.model_dump()) for content_obj in response_contents)
+            await sse_resp.send(payload_str)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sent SSE event payload %s", payload_str[:100])
+            # Terminal event then one loop yield the write drains before the
+            # response closes otherwise the connection half closes mid flush
+            # and the client's keepalive slot stalls on its next reuse
+            await sse_resp.send("", event="done")
+            await asyncio.sleep(0)
+        return sse_resp
+    finally:
+        conn_id_var.reset(token)
+
+
+def api_key_middleware(api_key: str):
+    """Builds aiohttp middleware enforcing bearer API key every request
+
+    Whole header compared precomputed expected bytes via compare digest
+    no split list allocation per request no timing side channel equal
+    length gate keeps compare digest cost constant
+    """
+    expected = ("Bearer " + api_key).encode("utf-8")
+    expected_len = len(expected)
+
+    @web.middleware
+    async def middleware(request: "web.Request", handler):
+        auth = request.headers.get("Authorization", "").encode("utf-8")
+        if len(auth) != expected_len or not hmac.compare_digest(auth, expected):
+            logger.warning("Rejected request invalid missing API key %s", request.remote)
+            raise web.HTTPForbidden(text="Invalid or missing API key")
+        return await handler(request)
+    return middleware
+
+
+async def _on_response_prepare(request: "web.Request", response: "web.StreamResponse") -> None:
+    # Reverse proxies nginx buffer SSE by default the header opts out so
+    # events reach the client as written not when the proxy feels full
+    response.headers["X-Accel-Buffering"] = "no"
+
+
+async def run_sse_server(enabled_tools: Iterable[str], host: str, port: int, api_key: Optional[str] = None) -> None:
+    """Serves MCP over SSE aiohttp POST /mcp one event per content"""
+    middlewares = [api_key_middleware(api_key)] if api_key else []
+    app = web.Application(middlewares=middlewares)
+    app["enabled_tools"] = enabled_tools
+    app.router.add_post("/mcp", handle_mcp_sse_request)
+    app.on_response_prepare.append(_on_response_prepare)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # backlog absorbs connection bursts without SYN drops reuse_port
+    # Linux only lets extra workers share the listener aiohttp already
+    # sets TCP_NODELAY on accepted sockets small SSE writes skip Nagle
+    site = web.TCPSite(runner, host, port, backlog=1024, reuse_port=True if sys.platform == "linux" else None)
+    await site.start()
+    logger.info("SSE server listening", extra={"host": host, "port": port, "enabled_tools": list(enabled_tools)})
+    # Idle on an Event set by SIGINT SIGTERM deterministic shutdown no
+    # forever pending Future no KeyboardInterrupt only teardown add
+    # signal handler missing some platforms falls back cancellation
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    registered = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+            registered.append(sig)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stop.wait()
+        logger.info("Shutdown signal received stopping SSE server")
+    finally:
+        for sig in registered:
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
+
+# --- End Server Transports ---
@@ -1,25 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import functools
 import json
 import logging
-import base64
-from typing import Any, Dict, List, Optional, Union, Sequence
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
 
 from google.api_core import exceptions as google_exceptions
 from mcp import types as mcp_types
-from google.cloud import secretmanager
+
+# Secret Manager imported lazily the grpc client stack costs a few
+# hundred ms at import callers that never fetch a secret skip it
+# entirely annotations stay stringified via future annotations
+secretmanager = None
+
+
+def _ensure_secretmanager():
+    global secretmanager
+    if secretmanager is None:
+        from google.cloud import secretmanager as _secretmanager
+        secretmanager = _secretmanager
+    return secretmanager
 # Import tenacity for retries
 from tenacity import (
     retry,
+    Retrying,
     stop_after_attempt,
+    stop_after_delay,
     wait_random_exponential,
     retry_if_exception_type
 )
 
+# Optional fast JSON serializer log formatting falls back stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional msgspec tier reusable encoder built once module scope stdlib
+# json dumps constructs its encoder every call enc hook str matches the
+# default str behaviour of the other tiers
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+_msgspec_encoder = msgspec.json.Encoder(enc_hook=str) if msgspec is not None else None
+
+if msgspec is not None:
+    # Typed response struct encodes from C level slots no dict hashing
+    # resizing per call omit defaults drops data when None matching the
+    # plain dict shape exactly
+    class _Resp(msgspec.Struct, omit_defaults=True):
+        status: str
+        message: str
+        data: Optional[Dict[str, Any]] = None
+else:
+    _Resp = None
+
 
 logger = logging.getLogger("mcp_agent.utils") # Use specific logger
 
 # Define a type alias for the common return type of tool functions
 McpToolReturnType = List[mcp_types.Content]
 
+# Standard LogRecord attributes anything else counts structured extra
+_LOG_RECORD_STD_KEYS = frozenset((
+    "name", "msg", "args", "levelname", "levelno", "pathname", "filename",
+    "module", "exc_info", "exc_text", "stack_info", "lineno", "funcName",
+    "created", "msecs", "relativeCreated", "thread", "threadName",
+    "processName", "process", "taskName", "message", "asctime",
+))
+
+
+class FastJsonFormatter(logging.Formatter):
+    """JSON log formatter fixed known keys no per record reflection
+
+    pythonjsonlogger JsonFormatter re parses its format string reflects
+    the LogRecord every line this builds a plain dict known keys carries
+    structured extras serializes orjson when available stdlib otherwise
+    """
+    __slots__ = ()
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "asctime": self.formatTime(record),
+            "levelname": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+            "pathname": record.pathname,
+            "lineno": record.lineno,
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_STD_KEYS and not key.startswith("_"):
+                payload[key] = value
+        if orjson is not None:
+            return orjson.dumps(payload, default=str).decode()
+        return json.dumps(payload, default=str)
+
 # --- Retry Configuration ---
 # Define exceptions that are generally safe to retry
 RETRYABLE_GCP_EXCEPTIONS = (
@@ -29,49 +114,211 @@ RETRYABLE_GCP_EXCEPTIONS = (
     google_exceptions.DeadlineExceeded,
 )
 
-# Configure the retry decorator
-# Stop after a few attempts use exponential backoff with jitter
-retry_on_gcp_transient_error = retry(
-    stop=stop_after_attempt(3),
-    wait=wait_random_exponential(multiplier=1, max=2), # Wait with jitter max few seconds
-    retry=retry_if_exception_type(RETRYABLE_GCP_EXCEPTIONS),
-    before_sleep=lambda retry_state: logger.warning(
-        f"Retrying GCP operation exception {retry_state.outcome.exception()} attempt {retry_state.attempt_number} wait {retry_state.next_action.sleep:.2f}s",
+# Retry budget env tunable ops adjust without redeploy wait is full
+# jitter random(0, min(2^n, cap)) decorrelated retries avoid thundering
+# herd amplification stop composes wall clock deadline with attempt cap
+_RETRY_MAX_ATTEMPTS = int(os.environ.get("MCP_RETRY_MAX_ATTEMPTS", "5"))
+_RETRY_MAX_DELAY = float(os.environ.get("MCP_RETRY_MAX_DELAY", "30"))
+
+
+def _log_retry(retry_state) -> None:
+    """Retry callback level gated no f-string no extra dict when WARNING
+    is filtered out the callback returns after one cheap check"""
+    if not logger.isEnabledFor(logging.WARNING):
+        return
+    exc = retry_state.outcome.exception()
+    logger.warning(
+        "Retrying GCP operation exception %s attempt %d wait %.2fs",
+        exc, retry_state.attempt_number, retry_state.next_action.sleep,
         extra={ # Add context for structured logging
             'gcp_retry_attempt': retry_state.attempt_number,
-            'gcp_retry_exception_type': type(retry_state.outcome.exception()).__name__,
+            'gcp_retry_exception_type': type(exc).__name__,
             'gcp_retry_wait': round(retry_state.next_action.sleep, 2)
         }
     )
+
+
+# Configure the retry decorator
+retry_on_gcp_transient_error = retry(
+    stop=stop_after_delay(_RETRY_MAX_DELAY) | stop_after_attempt(_RETRY_MAX_ATTEMPTS),
+    wait=wait_random_exponential(multiplier=1, max=_RETRY_MAX_DELAY),
+    retry=retry_if_exception_type(RETRYABLE_GCP_EXCEPTIONS),
+    before_sleep=_log_retry,
+)
+
+# Imperative retryer same policy the decorator pays the full wrapped
+# call state machine even when the first attempt succeeds the iterator
+# protocol runs a handful of ops on the happy path iteration state is
+# local per call sharing the object across threads is safe reraise
+# surfaces the final exception itself not a RetryError wrapper
+_gcp_retryer = Retrying(
+    stop=stop_after_delay(_RETRY_MAX_DELAY) | stop_after_attempt(_RETRY_MAX_ATTEMPTS),
+    wait=wait_random_exponential(multiplier=1, max=_RETRY_MAX_DELAY),
+    retry=retry_if_exception_type(RETRYABLE_GCP_EXCEPTIONS),
+    before_sleep=_log_retry,
+    reraise=True,
 )
 # --- End Retry Configuration ---
 
 
+class CircuitOpenError(RuntimeError):
+    """Raised when the secret fetch circuit is open call fails fast"""
+
+
+class _CircuitBreaker:
+    """Process wide circuit breaker consecutive failures open it
+
+    fail_max failures in a row open the circuit check raises
+    CircuitOpenError immediately until reset_timeout elapses then one
+    probe call passes through success closes the circuit again retries
+    stop queuing work against a backend known to be down excluded
+    outcomes NotFound PermissionDenied never count they are answers not
+    outages plain counter and lock no external dependency
+    """
+    __slots__ = ("fail_max", "reset_timeout", "_failures", "_opened_at", "_lock")
+
+    def __init__(self, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("Secret Manager circuit open failing fast")
+            # Cool off elapsed half open one probe proceeds the next
+            # failure reopens immediately
+            self._opened_at = None
+            self._failures = self.fail_max - 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+
+
+_secret_breaker = _CircuitBreaker()
+
 # Cache the Secret Manager client
 _secret_manager_client: Optional[secretmanager.SecretManagerServiceClient] = None
 
+def _make_secret_manager_client() -> secretmanager.SecretManagerServiceClient:
+    """Builds client tuned gRPC channel falls back default construction
+
+    Raised max concurrent streams lets parallel fetch_secret calls share
+    the HTTP/2 connection without flow control serialization the local
+    subchannel pool keeps this client off the global shared subchannels
+    any transport wiring failure falls back the stock client
+    """
+    _ensure_secretmanager()
+    try:
+        from google.cloud.secretmanager_v1.services.secret_manager_service import (
+            transports as _sm_transports,
+        )
+        channel = _sm_transports.SecretManagerServiceGrpcTransport.create_channel(
+            options=[
+                ("grpc.max_concurrent_streams", 100),
+                ("grpc.use_local_subchannel_pool", 1),
+            ],
+        )
+        transport = _sm_transports.SecretManagerServiceGrpcTransport(channel=channel)
+        return secretmanager.SecretManagerServiceClient(transport=transport)
+    except Exception:
+        logger.debug("Tuned gRPC channel unavailable using default Secret Manager client", exc_info=True)
+        return secretmanager.SecretManagerServiceClient()
+
+
 def get_secret_manager_client() -> secretmanager.SecretManagerServiceClient:
     """Initializes returns cached Secret Manager client uses ADC"""
     global _secret_manager_client
     if _secret_manager_client is None:
         logger.info("Initializing Google Cloud Secret Manager client")
         try:
-            _secret_manager_client = secretmanager.SecretManagerServiceClient()
+            _secret_manager_client = _make_secret_manager_client()
             logger.info("Secret Manager client initialized successfully")
         except Exception as e:
-            logger.critical(f"Failed to initialize Secret Manager client {e}", exc_info=True)
+            logger.critical("Failed to initialize Secret Manager client %s", e, exc_info=True)
             raise RuntimeError(f"Secret Manager client initialization failed {e}") from e
     return _secret_manager_client
 
-# Apply retry decorator to the function making the GCP call
-@retry_on_gcp_transient_error
-def _access_secret_version_sync(client: secretmanager.SecretManagerServiceClient, name: str) -> str:
-    """Synchronous helper fetch secret wrapped with retry"""
-    logger.debug(f"Accessing secret version sync {name}")
-    request = secretmanager.AccessSecretVersionRequest(name=name)
-    response = client.access_secret_version(request=request)
-    # Secret payload is bytes decode assuming UTF8
-    return response.payload.data.decode("UTF-8")
+@contextmanager
+def idempotent_call():
+    """Yields request metadata one idempotency token per logical call
+
+    Generate the token outside the retry wrapped function so every retry
+    of the same logical call carries the same token and the server can
+    discard duplicates retried writes must be idempotent or deduplicated
+    access secret version is read only and safe as is this exists for
+    mutating helpers added later
+    """
+    token = uuid.uuid4().hex
+    yield (("x-goog-request-params", f"idempotency-key={token}"),)
+
+
+@functools.lru_cache(maxsize=128)
+def _access_request_for(name: str):
+    """Caches the request proto per secret name construction allocates
+    and validates every call the message is never mutated after build so
+    sharing across calls and retries is safe"""
+    return secretmanager.AccessSecretVersionRequest(name=name)
+
+
+def _access_secret_version_sync(client: secretmanager.SecretManagerServiceClient, name: str, metadata=()) -> str:
+    """Synchronous helper fetch secret imperative retry loop"""
+    logger.debug("Accessing secret version sync %s", name)
+    request = _access_request_for(name)
+    for attempt in _gcp_retryer:
+        with attempt:
+            response = client.access_secret_version(request=request, metadata=metadata)
+            # Secret payload is bytes decode assuming UTF8
+            return response.payload.data.decode("UTF-8")
+
+# In process secret cache hit skips the RPC TLS round trip and the
+# whole retry breaker path pinned numeric versions are immutable cached
+# without expiry latest entries expire after the TTL plain dict reads
+# are atomic under the GIL the lock only guards mutation size bounded
+# oldest entry evicted first insertion order
+_SECRET_CACHE_TTL = float(os.environ.get("MCP_SECRET_CACHE_TTL", "300"))
+_SECRET_CACHE_MAXSIZE = 128
+_secret_cache: Dict[str, tuple] = {}
+_secret_cache_lock = threading.Lock()
+
+
+def _secret_cache_get(name: str) -> Optional[str]:
+    entry = _secret_cache.get(name)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and time.monotonic() >= expires_at:
+        with _secret_cache_lock:
+            _secret_cache.pop(name, None)
+        return None
+    return value
+
+
+def _secret_cache_put(name: str, value: str) -> None:
+    # Numeric final segment means a pinned version payload never changes
+    expires_at = None if name.rsplit("/", 1)[-1].isdigit() else time.monotonic() + _SECRET_CACHE_TTL
+    with _secret_cache_lock:
+        if len(_secret_cache) >= _SECRET_CACHE_MAXSIZE:
+            _secret_cache.pop(next(iter(_secret_cache)), None)
+        _secret_cache[name] = (value, expires_at)
+
+
+def _secret_cache_invalidate(name: str) -> None:
+    with _secret_cache_lock:
+        _secret_cache.pop(name, None)
+
 
 def fetch_secret(secret_version_name: str) -> Optional[str]:
     """
@@ -81,40 +328,169 @@ def fetch_secret(secret_version_name: str) -> Optional[str]:
 
     Returns decoded secret string or None if fails permanently
     """
+    # Validate once at the module boundary the internal path trusts the
+    # type cache keys are inserted as str by construction
     if not secret_version_name or not isinstance(secret_version_name, str):
         logger.error("Invalid secret version name provided for fetching")
         return None
+    return _fetch_secret_unchecked(secret_version_name)
+
+
+def _fetch_secret_unchecked(secret_version_name: str) -> Optional[str]:
+    """Internal fetch no per call validation callers guarantee str name"""
+    cached = _secret_cache_get(secret_version_name)
+    if cached is not None:
+        logger.debug("Secret cache hit %s", secret_version_name)
+        return cached
 
     try:
+        # Fail fast while the circuit is open no client no retries
+        _secret_breaker.check()
         client = get_secret_manager_client()
-        logger.info(f"Attempting to access secret version {secret_version_name}")
+        logger.info("Attempting to access secret version %s", secret_version_name)
         # Call retry wrapped synchronous function directly
         secret_payload = _access_secret_version_sync(client, name=secret_version_name)
-        logger.info(f"Successfully accessed secret version {secret_version_name}")
+        _secret_breaker.record_success()
+        _secret_cache_put(secret_version_name, secret_payload)
+        logger.info("Successfully accessed secret version %s", secret_version_name)
         return secret_payload
-    # Specific non retryable errors handled here
+    except CircuitOpenError:
+        logger.error("Secret Manager circuit open skipping fetch %s", secret_version_name)
+        return None
+    # Specific non retryable errors handled here never count against the
+    # breaker they are definitive answers not backend outages
     except google_exceptions.NotFound:
-        logger.error(f"Secret version not found {secret_version_name}")
+        _secret_cache_invalidate(secret_version_name)
+        logger.error("Secret version not found %s", secret_version_name)
         return None
     except google_exceptions.PermissionDenied:
-        logger.error(f"Permission denied accessing secret version {secret_version_name} Ensure role", exc_info=True)
+        _secret_cache_invalidate(secret_version_name)
+        logger.error("Permission denied accessing secret version %s Ensure role", secret_version_name, exc_info=True)
         return None
     # Catch errors after tenacity retries have failed
     except Exception as e:
-        logger.error(f"Failed access secret version {secret_version_name} after retries {e}", exc_info=True)
+        _secret_breaker.record_failure()
+        logger.error("Failed access secret version %s after retries %s", secret_version_name, e, exc_info=True)
         return None
 
 
-def format_response( status: str, message: str, data: Optional[Dict[str, Any]] = None) -> McpToolReturnType:
-    """Formats standard JSON response within single MCP TextContent object"""
-    payload: Dict[str, Any] = {"status": status, "message": message}
-    if data is not None: payload["data"] = data
-    try: json_string = json.dumps(payload, default=str) # Use default str for non serializable types
+# Async variant event loop callers the sync path blocks the loop for
+# the RPC plus retry sleeps the async client awaits both lazy singleton
+# double checked behind an asyncio lock cache and breaker shared with
+# the sync path
+_async_secret_manager_client: Optional[secretmanager.SecretManagerServiceAsyncClient] = None
+_async_secret_manager_lock = asyncio.Lock()
+
+
+async def get_secret_manager_async_client() -> secretmanager.SecretManagerServiceAsyncClient:
+    """Initializes returns cached async Secret Manager client uses ADC"""
+    global _async_secret_manager_client
+    if _async_secret_manager_client is None:
+        async with _async_secret_manager_lock:
+            if _async_secret_manager_client is None:
+                logger.info("Initializing async Secret Manager client")
+                _ensure_secretmanager()
+                _async_secret_manager_client = secretmanager.SecretManagerServiceAsyncClient()
+    return _async_secret_manager_client
+
+
+@retry_on_gcp_transient_error
+async def _access_secret_version_async(client: secretmanager.SecretManagerServiceAsyncClient, name: str, metadata=()) -> str:
+    """Async helper fetch secret retry sleeps await never block the loop"""
+    response = await client.access_secret_version(request=_access_request_for(name), metadata=metadata)
+    return response.payload.data.decode("UTF-8")
+
+
+async def fetch_secret_async(secret_version_name: str) -> Optional[str]:
+    """Async fetch_secret concurrent tool calls overlap one thread
+
+    Same semantics as the sync path shared cache shared breaker returns
+    decoded secret string or None on permanent failure
+    """
+    if not secret_version_name or not isinstance(secret_version_name, str):
+        logger.error("Invalid secret version name provided for fetching")
+        return None
+
+    cached = _secret_cache_get(secret_version_name)
+    if cached is not None:
+        logger.debug("Secret cache hit %s", secret_version_name)
+        return cached
+
+    try:
+        _secret_breaker.check()
+        client = await get_secret_manager_async_client()
+        secret_payload = await _access_secret_version_async(client, name=secret_version_name)
+        _secret_breaker.record_success()
+        _secret_cache_put(secret_version_name, secret_payload)
+        return secret_payload
+    except CircuitOpenError:
+        logger.error("Secret Manager circuit open skipping fetch %s", secret_version_name)
+        return None
+    except google_exceptions.NotFound:
+        _secret_cache_invalidate(secret_version_name)
+        logger.error("Secret version not found %s", secret_version_name)
+        return None
+    except google_exceptions.PermissionDenied:
+        _secret_cache_invalidate(secret_version_name)
+        logger.error("Permission denied accessing secret version %s Ensure role", secret_version_name, exc_info=True)
+        return None
+    except Exception as e:
+        _secret_breaker.record_failure()
+        logger.error("Failed access secret version %s after retries %s", secret_version_name, e, exc_info=True)
+        return None
+
+
+def _dumps(obj: Any) -> str:
+    """Serializes response payload orjson when available stdlib otherwise
+
+    Shared by every response formatter one switch point not one guarded
+    branch per call site default str covers non serializable leaf types
+    orjson first then the pooled msgspec encoder then stdlib
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    if _msgspec_encoder is not None:
+        return _msgspec_encoder.encode(obj).decode()
+    return json.dumps(obj, default=str)
+
+
+@functools.lru_cache(maxsize=512)
+def _format_cached(status: str, message: str) -> tuple:
+    """Builds caches data less responses the common ok paths repeat the
+    same (status, message) pair every call one encode one TextContent
+    total tuple keeps the cached value immutable"""
+    return (mcp_types.TextContent(type="text", text=_dumps({"status": status, "message": message})),)
+
+
+def format_response( status: str, message: str, data: Optional[Dict[str, Any]] = None, *,
+                     _TextContent=mcp_types.TextContent, _dumps=_dumps, _Resp=_Resp, _enc=_msgspec_encoder) -> McpToolReturnType:
+    """Formats standard JSON response within single MCP TextContent object
+
+    Keyword only defaults bind the hot globals as fastlocals LOAD_FAST
+    replaces module dict plus attribute lookups every invocation
+    """
+    if data is None:
+        # Fresh list per call callers may extend it contents shared
+        return list(_format_cached(status, message))
+    try:
+        # Every tool response funnels through here the struct path skips
+        # the payload dict entirely typed slots straight to JSON in C
+        # orjson over a dict serves when msgspec is absent stdlib last
+        if _Resp is not None:
+            json_string = _enc.encode(_Resp(status, message, data)).decode()
+        else:
+            json_string = _dumps({"status": status, "message": message, "data": data})
     except TypeError as e:
-        logger.error(f"JSON serialization error {e} payload {payload}", exc_info=True)
-        payload = {"status": "error", "message": f"Internal server error serialization {e}"}
-        json_string = json.dumps(payload)
-    return [mcp_types.TextContent(type="text", text=json_string)]
+        # Fast serializers reject some exotic leaf types stdlib with
+        # default str is the slow safety net before erroring out
+        payload: Dict[str, Any] = {"status": status, "message": message, "data": data}
+        try:
+            json_string = json.dumps(payload, default=str)
+        except TypeError:
+            logger.error("JSON serialization error %s payload %s", e, payload, exc_info=True)
+            payload = {"status": "error", "message": f"Internal server error serialization {e}"}
+            json_string = json.dumps(payload)
+    return [_TextContent(type="text", text=json_string)]
 
 # format chunked response remains but is unused by GCS now
 def format_chunked_response( status: str, message: str, data: Optional[Dict[str, Any]] = None, chunks: Optional[Sequence[str]] = None ) -> McpToolReturnType:
@@ -124,15 +500,18 @@ def format_chunked_response( status: str, message: str, data: Optional[Dict[str,
     if data is not None: base_payload["data"] = data
     if not chunks:
         logger.debug("Formatting single response no chunks")
-        responses.append(mcp_types.TextContent(type="text", text=json.dumps(base_payload, default=str)))
+        responses.append(mcp_types.TextContent(type="text", text=_dumps(base_payload)))
     else:
-        logger.debug(f"Formatting chunked response {len(chunks)} chunks")
-        first_payload = base_payload.copy(); first_payload["chunking"] = {"total_chunks": len(chunks)}
+        logger.debug("Formatting chunked response %d chunks", len(chunks))
+        # Flat schema chunk_index chunk_count top level every chunk the
+        # same shape no nested one key dicts no first chunk special case
+        # the shared fields still serialize once via the spliced prefix
+        prefix = '%s,"chunk_count":%d' % (_dumps(base_payload)[:-1], len(chunks))
         for i, chunk_content in enumerate(chunks):
-            current_payload = first_payload if i == 0 else base_payload.copy(); current_payload["chunk_info"] = {"index": i}; current_payload["content_chunk"] = chunk_content
-            try: json_string = json.dumps(current_payload, default=str)
+            try:
+                json_string = '%s,"chunk_index":%d,"content_chunk":%s}' % (prefix, i, _dumps(chunk_content))
             except TypeError as e:
-                logger.error(f"JSON serialization error chunk {i} {e}", exc_info=True); json_string = json.dumps({"status": "error", "message": f"Error serializing chunk {i} {e}", "chunk_info": {"index": i}})
+                logger.error("JSON serialization error chunk %d %s", i, e, exc_info=True); json_string = json.dumps({"status": "error", "message": f"Error serializing chunk {i} {e}", "chunk_index": i})
             responses.append(mcp_types.TextContent(type="text", text=json_string))
     return responses
 
@@ -142,23 +521,47 @@ def format_success( message: str, data: Optional[Dict[str, Any]] = None ) -> Mcp
 
 def format_error( message: str, data: Optional[Dict[str, Any]] = None ) -> McpToolReturnType:
     """Helper for error single responses"""
-    logger.warning(f"Operation error {message}" + (f" data {data}" if data else ""))
+    if data:
+        logger.warning("Operation error %s data %s", message, data)
+    else:
+        logger.warning("Operation error %s", message)
     return format_response("error", message, data)
 
 def format_info( message: str, data: Optional[Dict[str, Any]] = None ) -> McpToolReturnType:
     """Helper for informational single responses"""
     return format_response("info", message, data)
 
+# Message templates common GCP exceptions built once exact type lookup
+# is the hot path subclasses resolve through an MRO walk cached per
+# type below
+_GCP_ERROR_TEMPLATES: Dict[type, str] = {
+    google_exceptions.NotFound: "Resource not found {op} {e}",
+    google_exceptions.Forbidden: "Permission denied {op} Check credentials {e}",
+    google_exceptions.InvalidArgument: "Invalid argument {op} {e}",
+    google_exceptions.BadRequest: "Bad request {op} check args {e}",
+    google_exceptions.FailedPrecondition: "Precondition failed {op} {e}",
+    google_exceptions.AlreadyExists: "Resource already exists {op} {e}",
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_template(exc_type: type) -> Optional[str]:
+    """Resolves message template walking the MRO nearest ancestor wins
+    cached per exception type subclasses pay the walk once ever"""
+    for cls in exc_type.__mro__:
+        tmpl = _GCP_ERROR_TEMPLATES.get(cls)
+        if tmpl is not None:
+            return tmpl
+    return None
+
+
 def handle_gcp_error( e: Exception, operation_description: str) -> McpToolReturnType:
     """Handles common GCP exceptions formats standard error response"""
-    error_message = f"Unexpected error during {operation_description} {type(e).__name__} {e}"
     details = {"exception_type": type(e).__name__, "exception_details": str(e)}
-    # Map common GCP exceptions clearer messages
-    if isinstance(e, google_exceptions.NotFound): error_message = f"Resource not found {operation_description} {e}"
-    elif isinstance(e, google_exceptions.Forbidden): error_message = f"Permission denied {operation_description} Check credentials {e}"
-    elif isinstance(e, google_exceptions.InvalidArgument): error_message = f"Invalid argument {operation_description} {e}"
-    elif isinstance(e, google_exceptions.BadRequest): error_message = f"Bad request {operation_description} check args {e}"
-    elif isinstance(e, google_exceptions.FailedPrecondition): error_message = f"Precondition failed {operation_description} {e}"
-    elif isinstance(e, google_exceptions.AlreadyExists): error_message = f"Resource already exists {operation_description} {e}"
-    logger.error(f"GCP Error {operation_description} {type(e).__name__} {e}", exc_info=True)
+    tmpl = _resolve_template(type(e))
+    if tmpl is not None:
+        error_message = tmpl.format(op=operation_description, e=e)
+    else:
+        error_message = f"Unexpected error during {operation_description} {type(e).__name__} {e}"
+    logger.error("GCP Error %s %s %s", operation_description, type(e).__name__, e, exc_info=True)
     return format_error(error_message, data=details)
@@ -0,0 +1,68 @@
+"""Signed URL cache regression second default expiry call must hit"""
+import pytest
+
+pytest.importorskip("google.cloud.storage")
+
+from mcp_agent.gcp_tools import storage as storage_mod
+
+
+class _FakeBlob:
+    def __init__(self, counter):
+        self._counter = counter
+
+    def generate_signed_url(self, **kwargs):
+        self._counter["signs"] += 1
+        return "https://storage.googleapis.com/fake?sig=%d" % self._counter["signs"]
+
+
+class _FakeBucket:
+    def __init__(self, counter):
+        self._counter = counter
+
+    def blob(self, object_path):
+        return _FakeBlob(self._counter)
+
+
+class _FakeCredentials:
+    # No sign_bytes no signer_email the fast V4 path falls back the SDK
+    sign_bytes = None
+
+
+class _FakeClient:
+    def __init__(self, counter):
+        self._counter = counter
+        self._credentials = _FakeCredentials()
+
+    def bucket(self, bucket_name):
+        return _FakeBucket(self._counter)
+
+
+def test_second_default_expiry_call_hits_cache():
+    storage_mod.invalidate_signed_url_cache()
+    counter = {"signs": 0}
+    client = _FakeClient(counter)
+
+    url1, validity1 = storage_mod._generate_signed_url_sync(
+        client, "bucket", "path/obj.txt", "GET", expires_in_seconds=300)
+    assert counter["signs"] == 1
+    assert validity1 >= 300 + storage_mod._SIGNED_URL_SAFETY_MARGIN_SECONDS
+
+    url2, validity2 = storage_mod._generate_signed_url_sync(
+        client, "bucket", "path/obj.txt", "GET", expires_in_seconds=300)
+    assert counter["signs"] == 1
+    assert url2 == url1
+    assert validity2 >= 300
+
+
+def test_bucket_multiple_expiry_still_caches():
+    storage_mod.invalidate_signed_url_cache()
+    counter = {"signs": 0}
+    client = _FakeClient(counter)
+
+    storage_mod._generate_signed_url_sync(
+        client, "bucket", "obj", "GET",
+        expires_in_seconds=storage_mod._SIGNED_URL_EXPIRY_BUCKET_SECONDS * 2)
+    storage_mod._generate_signed_url_sync(
+        client, "bucket", "obj", "GET",
+        expires_in_seconds=storage_mod._SIGNED_URL_EXPIRY_BUCKET_SECONDS * 2)
+    assert counter["signs"] == 1